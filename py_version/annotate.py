@@ -0,0 +1,320 @@
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from book import OpeningBook
+from oominimax import Game
+from transposition import TranspositionTable, EXACT
+"""
+Streaming annotation of game logs.
+
+A log has one game per line, the moves in the numpad notation of
+Game.human_turn() (cells numbered 1, 2, ... in row-major order), either
+as one digit per move ("5193") or separated by spaces or commas ("5 1 9
+3"), the first player (X) moving first. Logs are read one line at a time
+from files or stdin and every game is replayed with Game.set_move(),
+which prints nothing. Each move gets the minimax value of the position it
+leads to, the value of the best move and a blunder flag when it is worse,
+all seen by the player who made it (+1 win, 0 draw, -1 loss). The value
+of every position is cached by its Zobrist key in a bounded
+TranspositionTable, so a position shared by many games is searched once;
+with --book the values are looked up in a book.py table instead.
+
+Annotated games are written as JSON lines, chunk_size games per file, so
+memory stays bounded whatever the size of the logs. A run can be split
+between processes: game n (counting from 0 over all the inputs) goes to
+shard n % count, and --workers runs that many shards at once, each
+writing its own files.
+
+Usage: python3 annotate.py [logs ...] [--output annotated] [--workers 4]
+       [--shard 0 4] [--book book.bin]
+"""
+
+COMP = +1
+# Names of the players in the output, the first mover first.
+NAMES = {COMP: 'X', -COMP: 'O'}
+
+
+def read_lines(paths):
+    """
+    Yields the lines of the logs one at a time
+    :param paths: files to read, '-' for stdin
+    :return: a generator of lines without their line ends
+    """
+    for path in paths:
+        if path == '-':
+            for line in sys.stdin:
+                yield line.rstrip('\r\n')
+            continue
+        with open(path) as log:
+            for line in log:
+                yield line.rstrip('\r\n')
+
+
+def parse_moves(text, cells):
+    """
+    Reads the moves of one game
+    :param text: a line of a log
+    :param cells: number of cells of the board
+    :return: list of move numbers, 1 to cells
+    """
+    text = text.replace(',', ' ')
+    if ' ' in text.strip() or cells > 9:
+        fields = text.split()
+    else:
+        fields = list(text.strip())
+    moves = []
+    for field in fields:
+        if not field.isdigit() or not 1 <= int(field) <= cells:
+            raise ValueError(f'bad move {field!r}')
+        moves.append(int(field))
+    return moves
+
+
+class Annotator():
+    def __init__(self, rows=3, cols=3, k=3, book=None, cache_size=1 << 16):
+        """Constructs necessary attributes for the Annotator class.
+
+        Arguments:
+        self: Represents instance of Annotator().
+        rows (int): Number of rows.
+        cols (int): Number of cols.
+        k (int): Number in a row needed to win.
+        book (str): Path of an OpeningBook to look values up in, or None
+        to search them with Game.minimax().
+        cache_size (int): Most positions kept in the cache.
+
+        Return: None
+        """
+        # self.game (Game): Board the games are replayed on.
+        self.game = Game(rows, cols, k)
+        # self.book (OpeningBook): Table of values, or None.
+        self.book = None
+        if book is not None:
+            self.book = OpeningBook(book)
+            if self.book.shape != (rows, cols, k):
+                self.book.close()
+                raise ValueError(f'{book} is a table for another board')
+        # self.cache (TranspositionTable): Position key -> value and best
+        # move of the positions annotated so far.
+        self.cache = TranspositionTable(cache_size)
+        # self.searches (int): Positions searched or looked up, not cached.
+        self.searches = 0
+
+    def __str__(self):
+        """Informal string representation of Annotator().
+
+        Arguments: self: Represents instance of Annotator().
+
+        Return: Informal string representing Annotator().
+        """
+        return 'A game log annotator with {} positions cached'.format(
+                len(self.cache))
+
+    def value(self, player):
+        """Minimax value of the position on the board.
+
+        Arguments:
+        self: Represents instance of Annotator().
+        player (int): The player to move.
+
+        Return: (tuple) (score, move) the score from the first player's
+        point of view and the move minimax() picks, None once the game is
+        over.
+        """
+        game = self.game
+        if game.game_over():
+            return game.evaluate(), None
+        if game.filled == game.rows * game.cols:
+            return 0, None
+        key = game.zobrist_key(player)
+        entry = self.cache.probe(key)
+        if entry is not None:
+            return entry[2], entry[3]
+        self.searches += 1
+        found = None
+        if self.book is not None:
+            found = self.book.lookup(game.get_state(), player)
+        if found is None:
+            found = game.minimax(len(game.empty_cells()), player)
+        score, move = found[2], (found[0], found[1])
+        self.cache.store(key, 0, EXACT, score, move)
+        return score, move
+
+    def annotate(self, moves):
+        """Replays one game and annotates its moves.
+
+        Arguments:
+        self: Represents instance of Annotator().
+        moves (list): Move numbers of the game.
+
+        Return: (dict) the moves with their annotations, the result (X, O,
+        draw, or None if unfinished) and the number of blunders.
+        """
+        game = self.game
+        cols = game.cols
+        game.set_state([[0] * cols for _ in range(game.rows)])
+        player = COMP
+        score, best = self.value(player)
+        annotations = []
+        for ply, number in enumerate(moves, 1):
+            if best is None:
+                raise ValueError(f'move {ply} is after the end of the game')
+            x, y = divmod(number - 1, cols)
+            if not game.set_move(x, y, player):
+                raise ValueError(f'move {ply} is on a taken cell')
+            after, following = self.value(-player)
+            annotations.append({
+                'ply': ply,
+                'player': NAMES[player],
+                'move': number,
+                'value': after * player,
+                'best_value': score * player,
+                'best_move': best[0] * cols + best[1] + 1,
+                'blunder': after * player < score * player,
+            })
+            score, best = after, following
+            player = -player
+
+        result = None
+        if game.wins(COMP):
+            result = NAMES[COMP]
+        elif game.wins(-COMP):
+            result = NAMES[-COMP]
+        elif best is None:
+            result = 'draw'
+        return {
+            'moves': moves,
+            'result': result,
+            'blunders': sum(move['blunder'] for move in annotations),
+            'annotations': annotations,
+        }
+
+
+def annotate_lines(lines, annotator, shard=None):
+    """
+    Annotates the games of a log, skipping blank lines
+    :param lines: lines of the log, as read_lines() yields them
+    :param annotator: the Annotator
+    :param shard: (index, count) to keep only the games of one shard, or
+    None for all
+    :return: a generator of annotated games, each with its number 'game'
+    counting from 0, or with an 'error' instead if the line is not a
+    valid game
+    """
+    index, count = shard if shard is not None else (0, 1)
+    cells = annotator.game.rows * annotator.game.cols
+    number = -1
+    for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        if number % count != index:
+            continue
+        try:
+            record = annotator.annotate(parse_moves(line, cells))
+        except ValueError as error:
+            record = {'line': line, 'error': str(error)}
+        yield {'game': number, **record}
+
+
+def write_chunks(records, prefix, chunk_size=100000):
+    """
+    Writes records as JSON lines to numbered files of at most chunk_size
+    lines, or to stdout without a prefix
+    :param records: dicts to write
+    :param prefix: file names are prefix-00000.jsonl, prefix-00001.jsonl,
+    ..., or None for stdout
+    :param chunk_size: most lines per file
+    :return: (paths, counts) the paths written and a dict of the numbers
+    of 'games', 'moves', 'blunders' and 'errors'
+    """
+    paths = []
+    lines = []
+    counts = {'games': 0, 'moves': 0, 'blunders': 0, 'errors': 0}
+
+    def flush():
+        if prefix is None:
+            sys.stdout.writelines(lines)
+        else:
+            path = f'{prefix}-{len(paths):05d}.jsonl'
+            with open(path, 'w') as output:
+                output.writelines(lines)
+            paths.append(path)
+        lines.clear()
+
+    for record in records:
+        counts['games'] += 1
+        if 'error' in record:
+            counts['errors'] += 1
+        else:
+            counts['moves'] += len(record['moves'])
+            counts['blunders'] += record['blunders']
+        lines.append(json.dumps(record) + '\n')
+        if len(lines) == chunk_size:
+            flush()
+    if lines or (prefix is not None and not paths):
+        flush()
+    return paths, counts
+
+
+def run_shard(paths, prefix, shape=(3, 3, 3), book=None, shard=None,
+              chunk_size=100000, cache_size=1 << 16):
+    """
+    Annotates one shard of the logs and writes it out
+    :param paths: files to read, '-' for stdin
+    :param prefix: prefix of the files to write, None for stdout
+    :param shape: (rows, cols, k) of the board
+    :param book: path of an OpeningBook, or None
+    :param shard: (index, count) or None for every game
+    :param chunk_size: most games per file
+    :param cache_size: most positions kept in the cache
+    :return: (paths, counts) as write_chunks() gives them
+    """
+    annotator = Annotator(*shape, book=book, cache_size=cache_size)
+    return write_chunks(annotate_lines(read_lines(paths), annotator, shard),
+                        prefix, chunk_size)
+
+
+def main():
+    """
+    Annotates logs from the command line
+    """
+    parser = argparse.ArgumentParser(description='Game log annotator.')
+    parser.add_argument('logs', nargs='*', default=['-'])
+    parser.add_argument('--size', type=int, nargs=3, default=(3, 3, 3),
+                        metavar=('ROWS', 'COLS', 'K'))
+    parser.add_argument('--book', default=None)
+    parser.add_argument('--output', metavar='PREFIX', default=None)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--cache-size', type=int, default=1 << 16)
+    parser.add_argument('--shard', type=int, nargs=2, default=None,
+                        metavar=('INDEX', 'COUNT'))
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+    if args.workers > 1 and ('-' in args.logs or args.output is None):
+        parser.error('--workers needs log files and --output')
+
+    if args.workers > 1:
+        with ProcessPoolExecutor(args.workers) as pool:
+            futures = [pool.submit(run_shard, args.logs,
+                                   f'{args.output}-{index}', args.size,
+                                   args.book, (index, args.workers),
+                                   args.chunk_size, args.cache_size)
+                       for index in range(args.workers)]
+            results = [future.result() for future in futures]
+    else:
+        results = [run_shard(args.logs, args.output, args.size, args.book,
+                             args.shard, args.chunk_size, args.cache_size)]
+
+    paths = [path for written, counts in results for path in written]
+    totals = {name: sum(counts[name] for written, counts in results)
+              for name in results[0][1]}
+    if args.output is not None:
+        print(f'Wrote {len(paths)} files')
+    print(json.dumps(totals), file=sys.stderr if args.output is None
+          else sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+from oominimax import Game, win_lines
+try:
+    import numpy as np
+except ImportError:
+    np = None
+"""
+Best moves and scores for many positions at once, without printing or
+playing a game.
+
+best_moves() takes a batch of boards (nested lists like Game.state, flat
+lists in row-major order or, if NumPy is installed, an N x cells int8
+array), searches every distinct position of the batch once with
+Game.minimax() and returns one [row, col, score] per board. Finished
+positions are not searched; with a NumPy array they are found for the
+whole batch at once by multiplying the boards with the line incidence
+matrix.
+"""
+
+HUMAN = -1
+COMP = +1
+
+
+def line_matrix(rows=3, cols=3, k=3):
+    """
+    Line incidence matrix of a board, needs NumPy
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: a (rows * cols, lines) int16 array, 1 where a cell is on a
+    line; a board (flattened) times it gives each line's sum, k or -k
+    when a player fills the line
+    """
+    lines = win_lines(rows, cols, k)
+    matrix = np.zeros((rows * cols, len(lines)), dtype=np.int16)
+    for index, line in enumerate(lines):
+        for x, y in line:
+            matrix[x * cols + y, index] = 1
+    return matrix
+
+
+def flatten(position):
+    """
+    Flattens a board given as a nested list
+    :param position: nested list or flat sequence of -1, 0 and +1
+    :return: a flat list in row-major order
+    """
+    cells = list(position)
+    if cells and isinstance(cells[0], (list, tuple)):
+        return [cell for row in cells for cell in row]
+    return cells
+
+
+def solve(game, cells, player, depth):
+    """
+    Searches one position
+    :param game: Game used for the search, its board is overwritten
+    :param cells: flat board in row-major order
+    :param player: the player to move
+    :param depth: most plies to search, or None for the whole game
+    :return: a list with [the best row, best col, best score]
+    """
+    cols = game.cols
+    game.set_state([list(cells[x * cols:(x + 1) * cols])
+                    for x in range(game.rows)])
+    empty = len(game.empty_cells())
+    if depth is not None:
+        empty = min(empty, depth)
+    return game.minimax(empty, player)
+
+
+def best_moves(positions, player=COMP, rows=3, cols=3, k=3, depth=None,
+               table=None):
+    """
+    Best move and score of every position of a batch
+    :param positions: nested lists, flat lists or an N x (rows * cols)
+    NumPy array of -1 (human), 0 (empty) and +1 (computer)
+    :param player: the player to move, one for all positions or one per
+    position
+    :param rows: number of rows of the boards
+    :param cols: number of cols of the boards
+    :param k: number in a row needed to win
+    :param depth: most plies to search, or None for the whole game
+    :param table: TranspositionTable shared with other batches, or None
+    for a fresh one
+    :return: a list with [the best row, best col, best score] per
+    position, [-1, -1, score] for finished positions
+    """
+    game = Game(rows, cols, k)
+    if table is not None:
+        game.set_table(table)
+    if np is not None and isinstance(positions, np.ndarray):
+        return best_moves_array(game, positions, player, depth)
+
+    boards = [flatten(position) for position in positions]
+    if isinstance(player, int):
+        players = [player] * len(boards)
+    else:
+        players = list(player)
+        if len(players) != len(boards):
+            raise ValueError('need one player per position')
+
+    # Each distinct position of the batch is searched once.
+    solved = {}
+    results = []
+    for cells, mover in zip(boards, players):
+        if len(cells) != rows * cols:
+            raise ValueError(f'expected {rows * cols} cells, got {cells}')
+        key = (tuple(cells), mover)
+        if key not in solved:
+            solved[key] = solve(game, cells, mover, depth)
+        results.append(list(solved[key]))
+    return results
+
+
+def best_moves_array(game, positions, player, depth):
+    """
+    best_moves() for a NumPy array of boards
+    :param game: Game used for the searches
+    :param positions: N x cells (or N x rows x cols) array
+    :param player: the player to move, one for all or one per position
+    :param depth: most plies to search, or None for the whole game
+    :return: a list with [the best row, best col, best score] per position
+    """
+    rows, cols, k = game.rows, game.cols, game.k
+    boards = np.asarray(positions, dtype=np.int8).reshape(len(positions),
+                                                          rows * cols)
+    players = np.broadcast_to(np.asarray(player, dtype=np.int8),
+                              (len(boards),))
+
+    # Terminal positions for the whole batch in one product.
+    sums = boards.astype(np.int16) @ line_matrix(rows, cols, k)
+    comp_wins = (sums == k).any(axis=1)
+    human_wins = (sums == -k).any(axis=1) & ~comp_wins
+    full = (boards != 0).all(axis=1)
+    terminal = comp_wins | human_wins | full
+    scores = comp_wins.astype(np.int8) - human_wins.astype(np.int8)
+
+    results = [None] * len(boards)
+    for index in np.flatnonzero(terminal):
+        results[index] = [-1, -1, int(scores[index])]
+
+    # Each distinct (board, player) pair left is searched once.
+    open_rows = np.flatnonzero(~terminal)
+    if len(open_rows):
+        powers = 3 ** np.arange(rows * cols, dtype=np.int64)
+        codes = (boards[open_rows] % 3).astype(np.int64) @ powers
+        codes = codes * 2 + (players[open_rows] == COMP)
+        unique, first, inverse = np.unique(codes, return_index=True,
+                                           return_inverse=True)
+        solved = []
+        for index in first:
+            row = open_rows[index]
+            solved.append(solve(game, boards[row].tolist(),
+                                int(players[row]), depth))
+        for row, which in zip(open_rows, inverse.ravel()):
+            results[row] = list(solved[which])
+    return results
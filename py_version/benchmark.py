@@ -0,0 +1,330 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter, strftime
+import minimax
+from book import reachable_positions
+from oominimax import Game
+from search import AlphaBetaEngine
+from tournament import percentiles
+from transposition import TranspositionTable
+"""
+Benchmarks of the searches and helpers of minimax.py and oominimax.py.
+
+Every search is timed from every distinct reachable position (seen from
+the player to move, who plays as the computer), grouped by depth (the
+number of empty cells), and reports nodes per second, per-position
+latency percentiles and the peak memory of the deepest search. The
+micro-benchmarks time wins(), empty_cells(), evaluate() and valid_move()
+over all those positions. The startup benchmarks time fresh interpreters
+that import the engine, or also pick a first move with a cold table or
+from the shipped book.bin, as short-lived workers do. Results are written
+as JSON; --compare prints how a run differs from an earlier one and
+exits with 1 on a regression.
+
+Usage: python3 benchmark.py [--max-depth 7] [--output benchmark.json]
+       [--compare old.json] [--startup-only]
+"""
+
+COMP = +1
+# Searches slower than this much times the old run count as regressions.
+THRESHOLD = 1.25
+
+
+def load(game, state):
+    """
+    Copies a state into a game's board
+    :param game: the Game
+    :param state: nested list to copy
+    """
+    game.set_state([row[:] for row in state])
+
+
+def oo_minimax(state, depth):
+    """
+    Game.minimax() without a transposition table
+    :return: nodes visited
+    """
+    game = Game()
+    game.set_table(None)
+    load(game, state)
+    game.minimax(depth, COMP)
+    return game.nodes
+
+
+def oo_minimax_table(state, depth):
+    """
+    Game.minimax() with a fresh transposition table
+    :return: nodes visited
+    """
+    game = Game()
+    game.set_table(TranspositionTable())
+    load(game, state)
+    game.minimax(depth, COMP)
+    return game.nodes
+
+
+def oo_alphabeta(state, depth):
+    """
+    AlphaBetaEngine with a fresh table
+    :return: nodes visited
+    """
+    game = Game()
+    load(game, state)
+    engine = AlphaBetaEngine()
+    engine.search(game, depth, COMP)
+    return engine.nodes
+
+
+def functional_minimax(state, depth):
+    """
+    minimax() of minimax.py
+    :return: nodes visited
+    """
+    minimax.nodes = 0
+    minimax.minimax([row[:] for row in state], depth, COMP)
+    return minimax.nodes
+
+
+def functional_alphabeta(state, depth):
+    """
+    alphabeta() of minimax.py
+    :return: nodes visited
+    """
+    minimax.nodes = 0
+    minimax.alphabeta([row[:] for row in state], depth, COMP)
+    return minimax.nodes
+
+
+# SEARCHES (dict): Searches by name, each called as search(state, depth).
+SEARCHES = {
+    'oominimax.minimax': oo_minimax,
+    'oominimax.minimax+table': oo_minimax_table,
+    'search.alphabeta': oo_alphabeta,
+    'minimax.minimax': functional_minimax,
+    'minimax.alphabeta': functional_alphabeta,
+}
+
+
+# STARTUP (dict): Programs run in a fresh interpreter by name: a bare
+# interpreter, importing the engine, searching a move after the human's
+# opening move with a cold table, and looking the same move up in the
+# shipped table.
+STARTUP = {
+    'interpreter': 'pass',
+    'import': 'import oominimax',
+    'first_move': 'from oominimax import Game\n'
+                  'game = Game()\n'
+                  'game.set_move(1, 1, -1)\n'
+                  'game.choose_move(1)',
+    'book_move': 'from book import OpeningBook\n'
+                 'book = OpeningBook()\n'
+                 'book.lookup([[0, 0, 0], [0, -1, 0], [0, 0, 0]], 1)',
+}
+
+
+def positions_by_depth(max_depth):
+    """
+    Distinct reachable positions grouped by their number of empty cells
+    :param max_depth: deepest group to keep
+    :return: a dict depth -> list of states
+    """
+    groups = {}
+    for state in reachable_positions():
+        depth = sum(row.count(0) for row in state)
+        if depth <= max_depth:
+            groups.setdefault(depth, []).append(state)
+    return dict(sorted(groups.items()))
+
+
+def bench_search(search, groups):
+    """
+    Times a search from every position
+    :param search: function (state, depth) -> nodes
+    :param groups: dict depth -> list of states
+    :return: a dict depth -> results, plus the peak memory of the deepest
+    search under 'peak_kib'
+    """
+    results = {}
+    for depth, states in groups.items():
+        times = []
+        nodes = 0
+        for state in states:
+            start = perf_counter()
+            nodes += search(state, depth)
+            times.append((perf_counter() - start) * 1000)
+        seconds = sum(times) / 1000
+        results[str(depth)] = {
+            'positions': len(states),
+            'nodes': nodes,
+            'seconds': seconds,
+            'nodes_per_second': nodes / seconds if seconds else None,
+            'latency_ms': percentiles(times),
+        }
+
+    deepest = max(groups)
+    tracemalloc.start()
+    search(groups[deepest][0], deepest)
+    results['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return results
+
+
+def bench_micro(groups, repeat):
+    """
+    Times the helpers of both implementations over every position
+    :param groups: dict depth -> list of states
+    :param repeat: number of passes over the positions
+    :return: a dict name -> nanoseconds per call
+    """
+    states = [state for group in groups.values() for state in group]
+    game = Game()
+    calls = {
+        'oominimax.wins': lambda: game.wins(COMP),
+        'oominimax.empty_cells': game.empty_cells,
+        'oominimax.evaluate': game.evaluate,
+        'oominimax.valid_move': lambda: game.valid_move(1, 1),
+        'minimax.wins': lambda: minimax.wins(minimax.board, COMP),
+        'minimax.empty_cells': lambda: minimax.empty_cells(minimax.board),
+        'minimax.evaluate': lambda: minimax.evaluate(minimax.board),
+        'minimax.valid_move': lambda: minimax.valid_move(1, 1),
+    }
+    results = {}
+    for name, call in calls.items():
+        elapsed = 0
+        for state in states:
+            load(game, state)
+            for row, cells in zip(minimax.board, state):
+                row[:] = cells
+            start = perf_counter()
+            for _ in range(repeat):
+                call()
+            elapsed += perf_counter() - start
+        results[name] = elapsed / (repeat * len(states)) * 1e9
+    return results
+
+
+def bench_startup(repeat):
+    """
+    Times the STARTUP programs, each in a new interpreter
+    :param repeat: number of runs of each program
+    :return: a dict name -> wall time percentiles in milliseconds
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, program in STARTUP.items():
+        times = []
+        for _ in range(repeat):
+            start = perf_counter()
+            subprocess.run([sys.executable, '-c', program], cwd=here,
+                           check=True)
+            times.append((perf_counter() - start) * 1000)
+        results[name] = percentiles(times)
+    return results
+
+
+def run(max_depth=9, repeat=10, searches=None, startup_only=False):
+    """
+    Runs the whole suite
+    :param max_depth: deepest positions to search from
+    :param repeat: passes over the positions for the micro-benchmarks,
+    and runs of each startup program
+    :param searches: names of the searches to run, all if None
+    :param startup_only: True to run only the startup benchmarks
+    :return: a dict with the environment, search, micro and startup
+    results
+    """
+    report = {
+        'time': strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'max_depth': max_depth,
+        'search': {},
+        'micro_ns': {},
+        'startup_ms': bench_startup(repeat),
+    }
+    if startup_only:
+        return report
+    groups = positions_by_depth(max_depth)
+    report['micro_ns'] = bench_micro(groups, repeat)
+    for name in searches or SEARCHES:
+        report['search'][name] = bench_search(SEARCHES[name], groups)
+    return report
+
+
+def compare(old, new, threshold=THRESHOLD):
+    """
+    Lists how a run differs from an earlier one
+    :param old: report of the earlier run
+    :param new: report of this run
+    :param threshold: slowdown ratio that counts as a regression
+    :return: (lines, regressions) the lines to print and how many
+    measurements got slower than threshold times the old ones
+    """
+    lines = []
+    regressions = 0
+    pairs = [(f'micro {name}', old['micro_ns'].get(name), value)
+             for name, value in new['micro_ns'].items()]
+    pairs += [(f'startup {name}',
+               old.get('startup_ms', {}).get(name, {}).get('p50'),
+               result['p50'])
+              for name, result in new.get('startup_ms', {}).items()]
+    for name, depths in new['search'].items():
+        for depth, result in depths.items():
+            if depth == 'peak_kib':
+                continue
+            before = old['search'].get(name, {}).get(depth)
+            pairs.append((f'{name} depth {depth}',
+                          before and before['seconds'], result['seconds']))
+    for label, before, after in pairs:
+        if not before:
+            lines.append(f'{label}: new')
+            continue
+        ratio = after / before
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        lines.append(f'{label}: {ratio:.2f}x{flag}')
+    return lines, regressions
+
+
+def main():
+    """
+    Runs the suite from the command line
+    """
+    parser = argparse.ArgumentParser(description='Search benchmarks.')
+    parser.add_argument('--max-depth', type=int, default=9)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--search', action='append', choices=SEARCHES)
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--compare', metavar='OLD_JSON')
+    parser.add_argument('--startup-only', action='store_true')
+    args = parser.parse_args()
+
+    report = run(args.max_depth, args.repeat, args.search,
+                 args.startup_only)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+    for name, depths in report['search'].items():
+        total = sum(result['seconds'] for depth, result in depths.items()
+                    if depth != 'peak_kib')
+        print(f'{name}: {total:.3f} s, peak {depths["peak_kib"]:.0f} KiB')
+    for name, result in report['startup_ms'].items():
+        print(f'startup {name}: {result["p50"]:.1f} ms')
+    print(f'Wrote {args.output}')
+
+    if args.compare:
+        with open(args.compare) as old_file:
+            lines, regressions = compare(json.load(old_file), report)
+        print('\n'.join(lines))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
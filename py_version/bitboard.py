@@ -0,0 +1,14 @@
+"""
+Masks of the 3x3 board for code that keeps a position as bitmasks of the
+players' cells. Bit 3 * x + y stands for cell [x, y], the same row-major
+order Game.empty_cells() uses.
+"""
+
+# Mask with a bit set for every cell of the board.
+FULL_MASK = (1 << 9) - 1
+# The 8 winning lines as masks: three rows, three cols, two diagonals.
+WIN_MASKS = (
+    0b000000111, 0b000111000, 0b111000000,
+    0b001001001, 0b010010010, 0b100100100,
+    0b100010001, 0b001010100,
+)
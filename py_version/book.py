@@ -0,0 +1,259 @@
+import mmap
+import os
+from oominimax import Game
+from symmetry import canonical, first_cell, restore_mask, transform_mask
+"""
+Perfect-play table for the whole game of tic-tac-toe, on any board.
+
+build_book() solves every reachable position once with Game.minimax(),
+searching only one position of each group of rotations and reflections,
+and writes a compact binary table; OpeningBook() maps that file into
+memory so Game.ai_turn() can find its move with a single lookup, and every
+process that loads the same file shares one copy of it. Opening a table
+reads only its header, so a restarted process can use it at once.
+
+File layout: an 8 byte header (MAGIC, VERSION, rows, cols, k) followed by
+one fixed-size record per position index. The index is the base-3 code of
+the board as seen by the player to move (0 empty, 1 own piece, 2
+opponent's piece, cell [0, 0] the least significant digit), so both sides
+use the same records. Boards of up to 15 cells have 1 byte records with
+the best cell (x * cols + y) in the low 4 bits and the score plus one in
+the next 2; larger boards have 2 byte little-endian records with the cell
+in the low 8 bits. A record of all ones marks positions that are not in
+the table (unreachable or already over).
+"""
+
+MAGIC = b'TTTB'
+VERSION = 2
+HEADER_SIZE = 8
+# Default location of the table, next to this file.
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'book.bin')
+
+
+def record_layout(cells):
+    """
+    Size and cell bits of the records of a board
+    :param cells: number of cells of the board
+    :return: (size, bits) the bytes per record and the bits of the cell
+    """
+    if cells <= 15:
+        return 1, 4
+    return 2, 8
+
+
+def default_path(rows=3, cols=3, k=3):
+    """
+    Default location of the table of a board, so that writing the table
+    of another board never replaces the shipped 3x3 one
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: DEFAULT_PATH for 3x3, else book-ROWSxCOLSxK.bin next to it
+    """
+    if (rows, cols, k) == (3, 3, 3):
+        return DEFAULT_PATH
+    return os.path.join(os.path.dirname(DEFAULT_PATH),
+                        f'book-{rows}x{cols}x{k}.bin')
+
+
+def book_index(state, player):
+    """
+    Index of a position in the table
+    :param state: the state of the current board
+    :param player: the player to move
+    :return: base-3 code of the board seen by the player to move
+    """
+    code = 0
+    for row in reversed(state):
+        for cell in reversed(row):
+            code = code * 3 + (cell * player) % 3
+    return code
+
+
+def reachable_positions(rows=3, cols=3, k=3):
+    """
+    Every position that can come up in a game, from the point of view of
+    the player to move (own pieces +1), whoever started
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: a list of states with at least one empty cell and no winner
+    """
+    game = Game(rows, cols, k)
+    state = game.get_state()
+    seen = set()
+    positions = []
+
+    def visit(player):
+        index = book_index(state, player)
+        if index in seen or game.game_over() or not game.empty_cells():
+            return
+        seen.add(index)
+        positions.append([[cell * player for cell in row] for row in state])
+        for x, y in game.empty_cells():
+            game.make_move(x, y, player)
+            visit(-player)
+            game.unmake_move(x, y)
+
+    visit(game.get_COMP())
+    visit(game.get_HUMAN())
+    return positions
+
+
+def build_book(path=None, rows=3, cols=3, k=3):
+    """
+    Solves every reachable position with Game.minimax() and writes the table.
+    Only the first position of each symmetry group is searched; the moves
+    with the best score are mapped to the others, which then get the first
+    of them in row-major order, the move minimax would pick there
+    :param path: file to write, default_path() of the board if None
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: number of positions written
+    """
+    size, bits = record_layout(rows * cols)
+    records = bytearray(b'\xff') * (size * 3 ** (rows * cols))
+    game = Game(rows, cols, k)
+    comp = game.get_COMP()
+    solved = {}
+    positions = reachable_positions(rows, cols, k)
+    for state in positions:
+        code, sym = canonical(state)
+        if code not in solved:
+            game.set_state(state)
+            depth = len(game.empty_cells())
+            best, optimal = None, 0
+            for x, y in game.empty_cells():
+                game.make_move(x, y, comp)
+                score = game.minimax(depth - 1, -comp)[2]
+                game.unmake_move(x, y)
+                if best is None or score > best:
+                    best, optimal = score, 0
+                if score == best:
+                    optimal |= 1 << (x * cols + y)
+            solved[code] = (best,
+                            transform_mask(optimal, sym, rows, cols))
+
+        score, optimal = solved[code]
+        x, y = first_cell(restore_mask(optimal, sym, rows, cols), cols)
+        record = (score + 1) << bits | (x * cols + y)
+        offset = size * book_index(state, comp)
+        records[offset:offset + size] = record.to_bytes(size, 'little')
+
+    if path is None:
+        path = default_path(rows, cols, k)
+    write_book(path, records, rows, cols, k)
+    return len(positions)
+
+
+def write_book(path, records, rows=3, cols=3, k=3):
+    """
+    Writes a table file
+    :param path: file to write
+    :param records: the records, laid out as record_layout() says
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    """
+    with open(path, 'wb') as book_file:
+        book_file.write(MAGIC + bytes([VERSION, rows, cols, k]))
+        book_file.write(records)
+
+
+class OpeningBook():
+    def __init__(self, path=DEFAULT_PATH):
+        """Constructs necessary attributes for the OpeningBook class.
+
+        Arguments:
+        self: Represents instance of OpeningBook().
+        path (str): Table written by build_book().
+
+        Return: None
+        """
+        # self.path (str): File the table was loaded from.
+        self.path = path
+        with open(path, 'rb') as book_file:
+            # self.records (mmap): Read-only view of the whole file.
+            self.records = mmap.mmap(book_file.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+        if len(self.records) < HEADER_SIZE \
+                or self.records[:4] != MAGIC or self.records[4] != VERSION:
+            self.records.close()
+            raise ValueError(f'{path} is not a tic-tac-toe book')
+        # self.shape (tuple): (rows, cols, k) of the board of the table.
+        self.shape = tuple(self.records[5:HEADER_SIZE])
+        rows, cols = self.shape[0], self.shape[1]
+        # self.size (int): Bytes per record.
+        # self.bits (int): Bits of the cell in a record.
+        self.size, self.bits = record_layout(rows * cols)
+        # self.empty (int): Record of positions not in the table.
+        self.empty = (1 << 8 * self.size) - 1
+        if len(self.records) != HEADER_SIZE + self.size * 3 ** (rows * cols):
+            self.records.close()
+            raise ValueError(f'{path} is not a tic-tac-toe book')
+
+    def __str__(self):
+        """Informal string representation of OpeningBook().
+
+        Arguments: self: Represents instance of OpeningBook().
+
+        Return: Informal string representing OpeningBook().
+        """
+        return 'A {}x{} perfect-play table mapped from {}'.format(
+                self.shape[0], self.shape[1], self.path)
+
+    def close(self):
+        """Unmaps the table.
+
+        Arguments: self: Represents instance of OpeningBook().
+
+        Return: None
+        """
+        self.records.close()
+
+    def lookup(self, state, player):
+        """Finds the move Game.minimax() would choose.
+
+        Arguments:
+        self: Represents instance of OpeningBook().
+        state (nested list): Current state of the board.
+        player (int): The player to move.
+
+        Return: (list) [the best row, best col, best score] or None if the
+        position is not in the table or the board has another shape.
+        """
+        rows, cols = self.shape[0], self.shape[1]
+        if len(state) != rows or len(state[0]) != cols:
+            return None
+        if self.size == 1:
+            record = self.records[HEADER_SIZE + book_index(state, player)]
+        else:
+            offset = HEADER_SIZE + self.size * book_index(state, player)
+            record = int.from_bytes(
+                self.records[offset:offset + self.size], 'little')
+        if record == self.empty:
+            return None
+        cell = record & ((1 << self.bits) - 1)
+        return [cell // cols, cell % cols,
+                ((record >> self.bits) - 1) * player]
+
+
+def main():
+    """
+    Builds a table from the command line
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description='Build a solved table.')
+    parser.add_argument('path', nargs='?', default=None)
+    parser.add_argument('--size', type=int, nargs=3, default=(3, 3, 3),
+                        metavar=('ROWS', 'COLS', 'K'))
+    args = parser.parse_args()
+    path = args.path or default_path(*args.size)
+    count = build_book(path, *args.size)
+    print(f'Wrote {count} positions to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,568 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+from time import perf_counter
+import annotate
+import batch
+import retrograde
+from book import (DEFAULT_PATH, OpeningBook, build_book, reachable_positions,
+                  write_book)
+from compact import CompactSession, SessionStore
+from gametree import walk
+from mcts import MCTSEngine
+from oominimax import Game
+from parallel import ParallelEngine
+from search import AlphaBetaEngine, IterativeDeepeningEngine
+from session import GameSession
+from tournament import run_tournament
+from transposition import SharedTranspositionTable, pack_entry, unpack_entry
+try:
+    import vectorized
+except ImportError:
+    vectorized = None
+"""
+Consistency checks of the solved tables, the engines and the tools.
+
+Most checks compare two ways of getting the same answer over every
+position (or every reachable one) of a board, usually with
+Game.minimax() as one of them, and fail with the first position where
+they differ; the others check known counts, legal moves and the results
+of seeded games. make tests only covers the console game, so these are
+what keep the rest honest when the search changes.
+
+Usage: python3 checks.py [--only book ...]
+"""
+
+COMP = +1
+HUMAN = -1
+# Boards (rows, cols, k) the solvers are compared on, small enough for
+# build_book().
+SHAPES = ((3, 3, 3), (2, 4, 3), (3, 3, 2), (2, 5, 3))
+# Boards (rows, cols, k, depth) the engines are compared with
+# Game.minimax() on: every position, searched depth plies deep or to the
+# end if None, or only the positions up to depth plies in.
+BOARDS = ((3, 3, 3, None), (2, 4, 3, None), (3, 3, 3, 4), (4, 4, 3, 2))
+
+
+def expect(condition, message):
+    """
+    Fails a check
+    :param condition: what must hold
+    :param message: what went wrong, for the report
+    """
+    if not condition:
+        raise AssertionError(message)
+
+
+def built_book(rows=3, cols=3, k=3):
+    """
+    Table build_book() writes for a board
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: the whole file as bytes
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'book.bin')
+        build_book(path, rows, cols, k)
+        with open(path, 'rb') as book_file:
+            return book_file.read()
+
+
+def written_book(records, rows=3, cols=3, k=3):
+    """
+    Table write_book() writes for solved records
+    :param records: the records, as a solver returns them
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: the whole file as bytes
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'book.bin')
+        write_book(path, records, rows, cols, k)
+        with open(path, 'rb') as book_file:
+            return book_file.read()
+
+
+def all_positions(rows=3, cols=3, k=3, depth=None):
+    """
+    Every distinct position of a board, finished ones included
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :param depth: most plies played, None for all
+    :return: a list of (state, player) with player the one to move
+    """
+    positions = []
+    for first in (COMP, HUMAN):
+        for moves, player, result in walk(rows, cols, k, first=first,
+                                          unique=True, depth=depth):
+            state = [[0] * cols for x in range(rows)]
+            mover = first
+            for cell in moves:
+                state[cell // cols][cell % cols] = mover
+                mover = -mover
+            positions.append((state, player))
+    return positions
+
+
+def same_as_minimax(engine, boards=BOARDS, search_depth=None):
+    """
+    Checks that an engine finds Game.minimax()'s move and score in every
+    open position of the boards, and leaves the game as it was
+    :param engine: function (rows, cols, k) -> the engine, one per board,
+    closed after it if it has a close()
+    :param boards: (rows, cols, k, depth) as in BOARDS
+    :param search_depth: plies to search every position, None for the
+    board's depth, depth then only limiting the positions
+    """
+    for rows, cols, k, depth in boards:
+        reference = Game(rows, cols, k)
+        game = Game(rows, cols, k)
+        searcher = engine(rows, cols, k)
+        name = type(searcher).__name__
+        try:
+            for state, player in all_positions(rows, cols, k, depth):
+                reference.set_state([row[:] for row in state])
+                empty = len(reference.empty_cells())
+                if reference.game_over() or not empty:
+                    continue
+                plies = search_depth if search_depth is not None \
+                    else depth if depth is not None else empty
+                plies = min(plies, empty)
+                expected = reference.minimax(plies, player)
+                game.set_state([row[:] for row in state])
+                found = searcher.search(game, plies, player)
+                expect(found == expected,
+                       f'{name} gives {found} for {state} with {player} '
+                       f'to move, minimax {expected}')
+                expect(game.get_state() == state,
+                       f'{name} changed the board {state}')
+        finally:
+            if hasattr(searcher, 'close'):
+                searcher.close()
+
+
+def check_book():
+    """
+    The shipped book.bin is what build_book() writes, and its move and
+    score for every reachable position, for both players, are the ones
+    Game.minimax() finds
+    """
+    with open(DEFAULT_PATH, 'rb') as book_file:
+        expect(book_file.read() == built_book(),
+               f'{DEFAULT_PATH} differs from what build_book() writes')
+    book = OpeningBook(DEFAULT_PATH)
+    game = Game()
+    try:
+        for state in reachable_positions():
+            for player in (COMP, HUMAN):
+                board = [[cell * player for cell in row] for row in state]
+                game.set_state(board)
+                found = game.minimax(len(game.empty_cells()), player)
+                looked_up = book.lookup(board, player)
+                expect(looked_up == found,
+                       f'book gives {looked_up} for {board} with {player}'
+                       f' to move, minimax {found}')
+    finally:
+        book.close()
+
+
+def check_batch():
+    """
+    batch.best_moves() gives the same answers for nested lists, flat lists
+    and a NumPy array of the same boards, and they are Game.minimax()'s
+    (or [-1, -1, Game.evaluate()] once the game is over)
+    """
+    positions = all_positions()
+    states = [state for state, player in positions]
+    players = [player for state, player in positions]
+    nested = batch.best_moves(states, players)
+    flat = batch.best_moves([sum(state, []) for state in states], players)
+    expect(flat == nested, 'flat lists and nested lists differ')
+    if batch.np is not None:
+        array = batch.best_moves(batch.np.array(
+            [sum(state, []) for state in states], dtype=batch.np.int8),
+            batch.np.array(players))
+        expect(array == nested, 'the NumPy array and the lists differ')
+    game = Game()
+    for (state, player), found in zip(positions, nested):
+        game.set_state([row[:] for row in state])
+        if game.game_over() or not game.empty_cells():
+            expected = [-1, -1, game.evaluate()]
+        else:
+            expected = game.minimax(len(game.empty_cells()), player)
+        expect(found == expected,
+               f'best_moves() gives {found} for {state} with {player} to'
+               f' move, expected {expected}')
+
+
+def check_compact(games=300, seed=0):
+    """
+    CompactSession and SessionStore play random games exactly like
+    GameSession: the same states, the same computer moves and the same
+    refused moves, and ids of dropped games stop working
+    :param games: number of games to play
+    :param seed: seed of the human's moves
+    """
+    rng = random.Random(seed)
+    store = SessionStore()
+    for number in range(games):
+        first = rng.choice((COMP, HUMAN))
+        session = GameSession(first)
+        compact = CompactSession(first)
+        game_id = store.new(first)
+        while not session.over():
+            if session.to_move == COMP:
+                # The computer's first move on an empty board is random.
+                states = []
+                for player in (session, compact):
+                    random.seed(number)
+                    states.append(player.ai_move())
+                random.seed(number)
+                states.append(store.ai_move(game_id))
+            else:
+                cell = rng.randrange(9)
+                x, y = divmod(cell, 3)
+                refused = []
+                for play in (session.play, compact.play,
+                             lambda x, y: store.play(game_id, x, y)):
+                    try:
+                        play(x, y)
+                        refused.append(False)
+                    except ValueError:
+                        refused.append(True)
+                expect(len(set(refused)) == 1,
+                       f'[{x}, {y}] refused by only some of {refused}')
+                states = [session.state(), compact.state(),
+                          store.state(game_id)]
+            expect(states[1] == states[0] and states[2] == states[0],
+                   f'game {number} differs: {states}')
+        store.drop(game_id)
+        try:
+            store.state(game_id)
+        except KeyError:
+            pass
+        else:
+            expect(False, f'dropped game {game_id} still answers')
+    expect(len(store) == 0, f'{len(store)} games left in the store')
+
+
+def check_retrograde():
+    """
+    retrograde.solve() writes the same table as build_book() on every
+    board of SHAPES
+    """
+    for shape in SHAPES:
+        records, count = retrograde.solve(*shape)
+        expect(written_book(records, *shape) == built_book(*shape),
+               f'retrograde and build_book() differ on {shape}')
+
+
+def check_vectorized():
+    """
+    vectorized.solve() gives the same records as retrograde.solve() on
+    every board of SHAPES and on 3x4, and evaluate_batch() the same scores
+    as Game.evaluate() on every position of 3x3 and 2x4; skipped without
+    NumPy
+    """
+    if vectorized is None:
+        return
+    for shape in SHAPES + ((3, 4, 3),):
+        expect(vectorized.solve(*shape) == retrograde.solve(*shape),
+               f'vectorized and retrograde differ on {shape}')
+    for rows, cols, k in ((3, 3, 3), (2, 4, 3)):
+        states = [state for state, player in all_positions(rows, cols, k)]
+        scores = vectorized.evaluate_batch(
+            [sum(state, []) for state in states], rows, cols, k)
+        game = Game(rows, cols, k)
+        for state, score in zip(states, scores):
+            game.set_state([row[:] for row in state])
+            expect(score == game.evaluate(),
+                   f'evaluate_batch() gives {score} for {state}, '
+                   f'Game.evaluate() {game.evaluate()}')
+
+
+def check_alphabeta():
+    """
+    AlphaBetaEngine finds Game.minimax()'s move and score on BOARDS, one
+    engine (and table) per board
+    """
+    same_as_minimax(lambda rows, cols, k: AlphaBetaEngine())
+
+
+def check_iterative():
+    """
+    IterativeDeepeningEngine without a time budget finds Game.minimax()'s
+    move and score on BOARDS but the full 3x3 one, whose negamax() runs in
+    check_alphabeta(); a cancel() after a search has returned does not
+    stop the next one, and one during a search stops it with a legal move
+    after at least one finished iteration
+    """
+    same_as_minimax(lambda rows, cols, k:
+                    IterativeDeepeningEngine(budget_ms=None), BOARDS[1:])
+    engine = IterativeDeepeningEngine(budget_ms=None)
+    game = Game()
+    game.set_move(0, 0, HUMAN)
+    expected = game.minimax(8, COMP)
+    engine.search(game, 8, COMP)
+    engine.cancel()
+    found = engine.search(game, 8, COMP)
+    expect(found[:2] == expected[:2] and engine.completed_depth == 8,
+           f'a late cancel() stopped the next search at depth '
+           f'{engine.completed_depth} with {found}')
+
+    game = Game(5, 5, 4)
+    game.set_move(2, 2, HUMAN)
+    timer = threading.Timer(0.05, engine.cancel)
+    timer.start()
+    start = perf_counter()
+    x, y, score = engine.search(game, 24, COMP)
+    timer.join()
+    expect(perf_counter() - start < 5,
+           'cancel() did not stop the search')
+    expect(engine.completed_depth >= 1 and game.valid_move(x, y),
+           f'a cancelled search gave [{x}, {y}] after depth '
+           f'{engine.completed_depth}')
+
+
+def check_parallel():
+    """
+    ParallelEngine, with every root move after the first sent to one of
+    two worker processes, finds Game.minimax()'s move and score in every
+    position of 3x3 up to two plies in searched to the end, and of 4x4 up
+    to one ply in searched three plies deep
+    """
+    def engine(rows, cols, k):
+        return ParallelEngine(workers=2, serial_below=1)
+
+    same_as_minimax(engine, ((3, 3, 3, 2),), search_depth=9)
+    same_as_minimax(engine, ((4, 4, 3, 1),), search_depth=3)
+
+
+def check_gametree():
+    """
+    walk() finds the known numbers of the 3x3 game: 549946 positions
+    along every line of play, 255168 of them finished games, 5478
+    distinct positions and 765 up to symmetry; the shards of a walk yield
+    the same positions between them, each once
+    """
+    positions = games = 0
+    for moves, player, result in walk():
+        positions += 1
+        games += result is not None
+    expect((positions, games) == (549946, 255168),
+           f'{positions} positions and {games} games, not 549946 and '
+           f'255168')
+    distinct = sorted(moves for moves, player, result in walk(unique=True))
+    symmetric = sum(1 for position in walk(unique=True, symmetric=True))
+    expect((len(distinct), symmetric) == (5478, 765),
+           f'{len(distinct)} distinct positions and {symmetric} up to '
+           f'symmetry, not 5478 and 765')
+    shards = sorted(moves for index in range(3)
+                    for moves, player, result
+                    in walk(unique=True, shard=(index, 3)))
+    expect(shards == distinct, 'the shards differ from the whole walk')
+
+
+def check_shared():
+    """
+    SharedTranspositionTable gives entries back as they were stored;
+    Game.minimax() and AlphaBetaEngine searching with one table give the
+    answers of Game.minimax() with a table of its own, and so does
+    ParallelEngine with its workers attached to one; boards too big for
+    its masks are refused
+    """
+    for entry in ((3, 0, 1, None), (9, 1, -0.25, 0b100010001),
+                  (255, 2, 0.5, (2, 1)), (0, 0, -1, (0, 0))):
+        expect(unpack_entry(*pack_entry(*entry)) == entry,
+               f'{entry} comes back as {unpack_entry(*pack_entry(*entry))}')
+    with SharedTranspositionTable(1 << 14) as table:
+        reference = Game()
+        game = Game()
+        game.set_table(table)
+        engine = AlphaBetaEngine(table)
+        for state, player in all_positions():
+            reference.set_state([row[:] for row in state])
+            empty = len(reference.empty_cells())
+            if reference.game_over() or not empty:
+                continue
+            expected = reference.minimax(empty, player)
+            game.set_state([row[:] for row in state])
+            found = [game.minimax(empty, player),
+                     engine.search(game, empty, player)]
+            expect(found == [expected, expected],
+                   f'with a shared table minimax and alpha-beta give '
+                   f'{found} for {state} with {player} to move, not '
+                   f'{expected}')
+        table.clear()
+        same_as_minimax(lambda rows, cols, k: ParallelEngine(
+            workers=2, serial_below=1, table=table), ((3, 3, 3, 2),),
+            search_depth=9)
+        try:
+            Game(7, 7, 4).set_table(table)
+        except ValueError:
+            pass
+        else:
+            expect(False, 'a 7x7 board was given a shared table')
+
+
+def check_mcts(positions=60, seed=0):
+    """
+    MCTSEngine, one engine per board so that its tree is reused, always
+    plays an empty cell with a score between -1 and +1 and leaves the
+    board as it was, with and without workers; and over seeded
+    tournaments it never loses to RandomEngine or to MinimaxEngine
+    :param positions: random positions searched per board
+    :param seed: seed of the positions
+    """
+    rng = random.Random(seed)
+    for rows, cols, k in ((3, 3, 3), (4, 4, 3)):
+        engine = MCTSEngine(playouts=100, seed=seed)
+        game = Game(rows, cols, k)
+        for number in range(positions):
+            game.set_state([[0] * cols for x in range(rows)])
+            player = rng.choice((COMP, HUMAN))
+            for ply in range(rng.randrange(rows * cols - 1)):
+                x, y = rng.choice(game.empty_cells())
+                game.set_move(x, y, player)
+                player = -player
+                if game.game_over():
+                    break
+            if game.game_over():
+                continue
+            state = [row[:] for row in game.get_state()]
+            x, y, score = engine.search(game, 0, player)
+            expect(game.get_state() == state,
+                   f'MCTSEngine changed the board {state}')
+            expect(game.valid_move(x, y) and -1 <= score <= 1,
+                   f'MCTSEngine gives [{x}, {y}, {score}] for {state}')
+    with MCTSEngine(playouts=200, workers=2, seed=seed) as engine:
+        game = Game(4, 4, 3)
+        game.set_move(1, 1, HUMAN)
+        x, y, score = engine.search(game, 0, COMP)
+        expect(game.valid_move(x, y) and -1 <= score <= 1,
+               f'MCTSEngine with workers gives [{x}, {y}, {score}]')
+    for opponent, playouts, games in (('random', 300, 20),
+                                      ('minimax', 1000, 10)):
+        report = run_tournament('mcts', opponent, games, workers=0,
+                                seed=seed, kwargs_a={'playouts': playouts})
+        expect(report['results']['b_wins'] == 0,
+               f'MCTSEngine lost to {opponent}: {report["results"]}')
+
+
+def check_annotate(games=200, seed=0):
+    """
+    annotate.py gives every move of random games the minimax values of
+    the positions before and after it, flags exactly the moves worse
+    than the best as blunders, gives the same records with the book as
+    without, and its shards and chunk files hold the same games as one
+    run; lines that are not games get an error record
+    :param games: number of random games
+    :param seed: seed of the games
+    """
+    rng = random.Random(seed)
+    lines = ['', '5 1 x', '55']
+    for number in range(games):
+        game = Game()
+        player = COMP
+        moves = []
+        while not game.game_over() and game.empty_cells():
+            x, y = rng.choice(game.empty_cells())
+            game.set_move(x, y, player)
+            moves.append(str(x * 3 + y + 1))
+            player = -player
+        del moves[rng.randrange(len(moves)):]
+        lines.append(' '.join(moves) if number % 2 else ''.join(moves))
+
+    searched = list(annotate.annotate_lines(lines, annotate.Annotator()))
+    booked = list(annotate.annotate_lines(
+        lines, annotate.Annotator(book=DEFAULT_PATH)))
+    expect(booked == searched, 'annotations with the book differ')
+    errors = [record['line'] for record in searched if 'error' in record]
+    expect(errors == ['5 1 x', '55'], f'error records for {errors}')
+    game = Game()
+    for record in searched:
+        if 'error' in record:
+            continue
+        game.set_state([[0] * 3 for x in range(3)])
+        player = COMP
+        for move in record['annotations']:
+            before = game.minimax(len(game.empty_cells()), player)
+            x, y = divmod(move['move'] - 1, 3)
+            game.set_move(x, y, player)
+            if game.game_over() or not game.empty_cells():
+                after = game.evaluate()
+            else:
+                after = game.minimax(len(game.empty_cells()), -player)[2]
+            expected = (after * player, before[2] * player,
+                        after * player < before[2] * player)
+            found = (move['value'], move['best_value'], move['blunder'])
+            expect(found == expected,
+                   f'game {record["game"]} ply {move["ply"]} is annotated '
+                   f'{found}, expected {expected}')
+            player = -player
+
+    shards = sorted((record for index in range(3)
+                     for record in annotate.annotate_lines(
+                         lines, annotate.Annotator(), (index, 3))),
+                    key=lambda record: record['game'])
+    expect(shards == searched, 'the shards differ from one run')
+    with tempfile.TemporaryDirectory() as directory:
+        paths, counts = annotate.write_chunks(
+            searched, os.path.join(directory, 'annotated'), 64)
+        written = []
+        for path in paths:
+            with open(path) as chunk:
+                written.extend(json.loads(line) for line in chunk)
+    expect(written == searched and len(paths) == -(-len(searched) // 64),
+           f'{len(paths)} chunk files do not hold the annotations')
+    expect(counts['games'] == len(searched) and counts['errors'] == 2,
+           f'write_chunks() counts {counts}')
+
+
+# CHECKS (dict): Checks by name, each raising AssertionError on failure.
+CHECKS = {
+    'book': check_book,
+    'batch': check_batch,
+    'compact': check_compact,
+    'retrograde': check_retrograde,
+    'vectorized': check_vectorized,
+    'alphabeta': check_alphabeta,
+    'iterative': check_iterative,
+    'parallel': check_parallel,
+    'gametree': check_gametree,
+    'shared': check_shared,
+    'mcts': check_mcts,
+    'annotate': check_annotate,
+}
+
+
+def main():
+    """
+    Runs the checks from the command line, exiting with 1 if any fails
+    """
+    parser = argparse.ArgumentParser(description='Consistency checks.')
+    parser.add_argument('--only', nargs='+', choices=CHECKS, default=None)
+    args = parser.parse_args()
+    failures = 0
+    for name in args.only or CHECKS:
+        start = perf_counter()
+        try:
+            CHECKS[name]()
+        except AssertionError as error:
+            failures += 1
+            print(f'{name}: FAILED: {error}')
+            continue
+        print(f'{name}: ok ({perf_counter() - start:.1f} s)')
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
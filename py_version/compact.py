@@ -0,0 +1,419 @@
+from array import array
+from bitboard import FULL_MASK, WIN_MASKS
+from oominimax import Game
+"""
+Compact 3x3 game sessions for keeping millions of games in memory.
+
+A whole game is one packed int (a word): bits 0-8 are the computer's
+cells and bits 9-17 the human's, in the row-major order of bitboard.py,
+bit 18 is set when the computer is to move and bit 19 once the game is
+over. CompactSession keeps that one int in a __slots__ object, and
+SessionStore keeps the words of many games in one array of 32-bit
+unsigned ints, reusing the slots of dropped games; the store's upper bits
+hold an in-use flag and a generation number so ids of dropped games are
+not mistaken for the games that reuse their slots.
+
+Both play like GameSession and answer state() with the same dict. The
+computer's moves are searched on one Game shared by all the sessions.
+"""
+
+HUMAN = -1
+COMP = +1
+# Bit of a word set when the computer is to move.
+SIDE_BIT = 1 << 18
+# Bit of a word set once the game is over.
+OVER_BIT = 1 << 19
+# Bits of a word describing the game itself, without the store's bits.
+GAME_MASK = (1 << 20) - 1
+# Bit of a store word set while its slot holds a game.
+USED_BIT = 1 << 20
+# Bits of a store word above this hold the slot's generation number.
+GENERATION_SHIFT = 21
+GENERATIONS = 1 << (32 - GENERATION_SHIFT)
+
+
+def new_word(first=HUMAN):
+    """
+    Word of a game that has not started
+    :param first: the player who moves first, HUMAN or COMP
+    :return: the packed game
+    """
+    if first not in (HUMAN, COMP):
+        raise ValueError(f'first must be {HUMAN} or {COMP}')
+    return SIDE_BIT if first == COMP else 0
+
+
+def winner(word):
+    """
+    Player who has completed a line in a packed game
+    :param word: the packed game
+    :return: COMP, HUMAN or 0 if nobody
+    """
+    comp = word & FULL_MASK
+    human = (word >> 9) & FULL_MASK
+    for line in WIN_MASKS:
+        if comp & line == line:
+            return COMP
+        if human & line == line:
+            return HUMAN
+    return 0
+
+
+def to_move(word):
+    """
+    Player whose turn it is in a packed game
+    :param word: the packed game
+    :return: COMP, HUMAN or 0 once the game is over
+    """
+    if word & OVER_BIT:
+        return 0
+    return COMP if word & SIDE_BIT else HUMAN
+
+
+def to_state(word):
+    """
+    Board of a packed game as a nested list like Game.state
+    :param word: the packed game
+    :return: a 3x3 nested list of -1, 0 and +1
+    """
+    return [[COMP if word >> (3 * x + y) & 1
+             else HUMAN if word >> (9 + 3 * x + y) & 1 else 0
+             for y in range(3)] for x in range(3)]
+
+
+def play_word(word, player, x, y):
+    """
+    Plays a move on a packed game, with GameSession.move()'s checks
+    :param word: the packed game
+    :param player: HUMAN or COMP, must be the player to move
+    :param x: X coordinate
+    :param y: Y coordinate
+    :return: the packed game after the move
+    """
+    if word & OVER_BIT:
+        raise ValueError('the game is over')
+    if player != to_move(word):
+        raise ValueError(f'it is not player {player}\'s turn')
+    cell = 3 * x + y
+    if not (0 <= x < 3 and 0 <= y < 3) or (word | word >> 9) >> cell & 1:
+        raise ValueError(f'[{x}, {y}] is not an empty cell')
+
+    word ^= SIDE_BIT
+    if player == COMP:
+        word |= 1 << cell
+        mine = word & FULL_MASK
+    else:
+        word |= 1 << (9 + cell)
+        mine = (word >> 9) & FULL_MASK
+    full = (word | word >> 9) & FULL_MASK == FULL_MASK
+    if full or any(mine & line == line for line in WIN_MASKS):
+        word |= OVER_BIT
+    return word
+
+
+def word_state(word):
+    """
+    GameSession.state() of a packed game
+    :param word: the packed game
+    :return: a dict with 'board', 'to_move', 'over' and 'winner'
+    """
+    return {
+        'board': to_state(word),
+        'to_move': to_move(word),
+        'over': bool(word & OVER_BIT),
+        'winner': winner(word),
+    }
+
+
+# shared_game (Game): Game the computer's moves of every compact session
+# are searched on, made on first use.
+shared_game = None
+
+
+def choose_word_move(word, game=None):
+    """
+    Searches the computer's move in a packed game
+    :param word: the packed game, with the computer to move
+    :param game: Game to search on, the shared one if None
+    :return: a list [x, y]
+    """
+    global shared_game
+    if game is None:
+        if shared_game is None:
+            shared_game = Game()
+        game = shared_game
+    game.set_state(to_state(word))
+    return game.choose_move(COMP)
+
+
+class CompactSession():
+    __slots__ = ('word',)
+
+    def __init__(self, first=HUMAN, word=None):
+        """Constructs necessary attributes for the CompactSession class.
+
+        Arguments:
+        self: Represents instance of CompactSession().
+        first (int): The player who moves first, HUMAN or COMP.
+        word (int): Packed game to resume instead, or None.
+
+        Return: None
+        """
+        # self.word (int): The packed game.
+        self.word = new_word(first) if word is None else word & GAME_MASK
+
+    def __str__(self):
+        """Informal string representation of CompactSession().
+
+        Arguments: self: Represents instance of CompactSession().
+
+        Return: Informal string representing CompactSession().
+        """
+        return 'A compact game session {:#07x} with {} to move'.format(
+                self.word, to_move(self.word))
+
+    def over(self):
+        """Tests if the game has ended.
+
+        Arguments: self: Represents instance of CompactSession().
+
+        Return: (bool) True once somebody won or the board is full.
+        """
+        return bool(self.word & OVER_BIT)
+
+    def state(self):
+        """Snapshot of the game, the same dict as GameSession.state().
+
+        Arguments: self: Represents instance of CompactSession().
+
+        Return: (dict) 'board', 'to_move', 'over' and 'winner'.
+        """
+        return word_state(self.word)
+
+    def move(self, player, x, y):
+        """Plays a move for either player.
+
+        Arguments:
+        self: Represents instance of CompactSession().
+        player (int): HUMAN or COMP, must be the player to move.
+        x (int): X coordinate.
+        y (int): Y coordinate.
+
+        Return: None
+        """
+        self.word = play_word(self.word, player, x, y)
+
+    def play(self, x, y):
+        """Plays the human's move.
+
+        Arguments:
+        self: Represents instance of CompactSession().
+        x (int): X coordinate.
+        y (int): Y coordinate.
+
+        Return: (dict) state() after the move.
+        """
+        self.move(HUMAN, x, y)
+        return self.state()
+
+    def ai_move(self, game=None):
+        """Lets the computer choose and play its move.
+
+        Arguments:
+        self: Represents instance of CompactSession().
+        game (Game): Game to search on, the shared one if None.
+
+        Return: (dict) state() after the move.
+        """
+        if to_move(self.word) != COMP:
+            raise ValueError('it is not the computer\'s turn')
+        x, y = choose_word_move(self.word, game)
+        self.move(COMP, x, y)
+        return self.state()
+
+
+class SessionStore():
+    def __init__(self, game=None):
+        """Constructs necessary attributes for the SessionStore class.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game (Game): Game the computer's moves are searched on, the shared
+        one if None.
+
+        Return: None
+        """
+        # self.words (array): Packed game and store bits of every slot.
+        self.words = array('I')
+        # self.free (array): Slots of dropped games, reused first.
+        self.free = array('I')
+        # self.game (Game): Game the computer's moves are searched on.
+        self.game = game
+        # self.count (int): Number of games in the store.
+        self.count = 0
+
+    def __str__(self):
+        """Informal string representation of SessionStore().
+
+        Arguments: self: Represents instance of SessionStore().
+
+        Return: Informal string representing SessionStore().
+        """
+        return 'A store of {} compact game sessions in {} bytes'.format(
+                self.count, self.nbytes())
+
+    def __len__(self):
+        """Number of games in the store.
+
+        Arguments: self: Represents instance of SessionStore().
+
+        Return: (int) number of games.
+        """
+        return self.count
+
+    def __contains__(self, game_id):
+        """Tests if an id names a game in the store.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game_id (int): Id returned by new().
+
+        Return: (bool) True if the game is in the store.
+        """
+        try:
+            self.slot(game_id)
+        except KeyError:
+            return False
+        return True
+
+    def nbytes(self):
+        """Memory taken by the store's arrays.
+
+        Arguments: self: Represents instance of SessionStore().
+
+        Return: (int) bytes of the allocated slots and free list.
+        """
+        return (self.words.buffer_info()[1] * self.words.itemsize
+                + self.free.buffer_info()[1] * self.free.itemsize)
+
+    def slot(self, game_id):
+        """Finds the slot of a game.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game_id (int): Id returned by new().
+
+        Return: (int) the slot index.
+        """
+        slot, generation = divmod(game_id, GENERATIONS)
+        if slot >= len(self.words) or game_id < 0:
+            raise KeyError(game_id)
+        word = self.words[slot]
+        if not word & USED_BIT or word >> GENERATION_SHIFT != generation:
+            raise KeyError(game_id)
+        return slot
+
+    def new(self, first=HUMAN):
+        """Starts a game.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        first (int): The player who moves first, HUMAN or COMP.
+
+        Return: game_id (int): Id of the new game.
+        """
+        word = new_word(first)
+        if self.free:
+            slot = self.free.pop()
+            generation = (self.words[slot] >> GENERATION_SHIFT) + 1
+            generation %= GENERATIONS
+            self.words[slot] = word | USED_BIT | generation << \
+                GENERATION_SHIFT
+        else:
+            slot, generation = len(self.words), 0
+            self.words.append(word | USED_BIT)
+        self.count += 1
+        return slot * GENERATIONS + generation
+
+    def drop(self, game_id):
+        """Forgets a game, freeing its slot for the next new() one.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game_id (int): Id returned by new().
+
+        Return: None
+        """
+        slot = self.slot(game_id)
+        self.words[slot] &= ~USED_BIT & 0xFFFFFFFF
+        self.free.append(slot)
+        self.count -= 1
+
+    def session(self, game_id):
+        """Copy of a game as a CompactSession.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game_id (int): Id returned by new().
+
+        Return: (CompactSession) the game.
+        """
+        return CompactSession(word=self.words[self.slot(game_id)])
+
+    def state(self, game_id):
+        """Snapshot of a game, the same dict as GameSession.state().
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game_id (int): Id returned by new().
+
+        Return: (dict) 'board', 'to_move', 'over' and 'winner'.
+        """
+        return word_state(self.words[self.slot(game_id)] & GAME_MASK)
+
+    def move(self, game_id, player, x, y):
+        """Plays a move for either player.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game_id (int): Id returned by new().
+        player (int): HUMAN or COMP, must be the player to move.
+        x (int): X coordinate.
+        y (int): Y coordinate.
+
+        Return: None
+        """
+        slot = self.slot(game_id)
+        word = self.words[slot]
+        self.words[slot] = play_word(word & GAME_MASK, player, x, y) \
+            | (word & ~GAME_MASK)
+
+    def play(self, game_id, x, y):
+        """Plays the human's move.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game_id (int): Id returned by new().
+        x (int): X coordinate.
+        y (int): Y coordinate.
+
+        Return: (dict) state() after the move.
+        """
+        self.move(game_id, HUMAN, x, y)
+        return self.state(game_id)
+
+    def ai_move(self, game_id):
+        """Lets the computer choose and play its move.
+
+        Arguments:
+        self: Represents instance of SessionStore().
+        game_id (int): Id returned by new().
+
+        Return: (dict) state() after the move.
+        """
+        word = self.words[self.slot(game_id)] & GAME_MASK
+        if to_move(word) != COMP:
+            raise ValueError('it is not the computer\'s turn')
+        x, y = choose_word_move(word, self.game)
+        self.move(game_id, COMP, x, y)
+        return self.state(game_id)
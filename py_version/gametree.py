@@ -0,0 +1,274 @@
+import argparse
+import json
+from oominimax import Game
+from symmetry import group
+"""
+Lazy walks over the game tree, for analytics on boards of any size.
+
+walk() plays and takes back moves on one Game in depth-first order and
+yields every position as it reaches it, so it only ever holds the moves
+of the current line: memory grows with the depth of the tree, not its
+size. It can yield every line of play, or every distinct position once,
+or every position once up to rotations and reflections. Distinct
+positions are found without remembering the ones already seen: a
+position is kept only when it is reached from its parent, the position
+without the highest cell (on its symmetry representative) the last
+mover could have played.
+
+A walk can be split between workers: the subtrees below the positions at
+ply split are dealt round-robin to count shards, in the order the walk
+meets them, and shard 0 also yields the positions above them.
+
+Usage: python3 gametree.py [--unique] [--symmetric] [--shard 0 4]
+       [--output positions]
+"""
+
+HUMAN = -1
+COMP = +1
+
+
+def status(game):
+    """
+    Result of a position
+    :param game: the Game
+    :return: COMP or HUMAN if that player won, 0 for a draw (full board),
+    None while the game goes on
+    """
+    if game.wins(COMP):
+        return COMP
+    if game.wins(HUMAN):
+        return HUMAN
+    if game.filled == game.rows * game.cols:
+        return 0
+    return None
+
+
+def position_key(game, symmetric):
+    """
+    Key telling positions apart
+    :param game: the Game
+    :param symmetric: True to give the same key to symmetric positions
+    :return: (key, t) the Zobrist key and the symmetry of the
+    representative, 0 if not symmetric
+    """
+    if symmetric:
+        key = min(game.hashes)
+        return key, game.hashes.index(key)
+    return game.hashes[0], 0
+
+
+def parent_key(game, player, symmetric):
+    """
+    Key of the parent of a position in a walk of distinct positions: the
+    position without the highest cell of the last mover, on the
+    representative, whose removal leaves the last mover without a line
+    :param game: the Game, left unchanged
+    :param player: the player who moved last
+    :param symmetric: True when walking symmetry representatives
+    :return: the parent's key, as position_key() gives it
+    """
+    t = position_key(game, symmetric)[1]
+    inverse = group(game.rows, game.cols)[1][t]
+    cols = game.cols
+    state = game.get_state()
+    for target in range(game.rows * cols - 1, -1, -1):
+        x, y = divmod(inverse[target], cols)
+        if state[x][y] != player:
+            continue
+        game.unmake_move(x, y)
+        key = None
+        if game.completed[player] == 0:
+            key = position_key(game, symmetric)[0]
+        game.make_move(x, y, player)
+        if key is not None:
+            return key
+    return None
+
+
+def children(game, player, unique, symmetric):
+    """
+    Cells to play from a position
+    :param game: the Game
+    :param player: the player to move
+    :param unique: True to keep only moves to positions whose parent this
+    position is, once each
+    :param symmetric: True when walking symmetry representatives
+    :return: a list of cells x * cols + y
+    """
+    cols = game.cols
+    cells = [x * cols + y for x, y in game.empty_cells()]
+    if not unique:
+        return cells
+    key = position_key(game, symmetric)[0]
+    seen = set()
+    kept = []
+    for cell in cells:
+        x, y = divmod(cell, cols)
+        game.make_move(x, y, player)
+        child = position_key(game, symmetric)[0]
+        if child not in seen and parent_key(game, player, symmetric) == key:
+            seen.add(child)
+            kept.append(cell)
+        game.unmake_move(x, y)
+    return kept
+
+
+def walk(rows=3, cols=3, k=3, first=COMP, prefix=(), unique=False,
+         symmetric=False, depth=None, where=None, shard=None, split=2):
+    """
+    Yields the positions of the game tree one at a time, depth-first
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :param first: the player who moves first
+    :param prefix: cells (x * cols + y) played before the walk starts; with
+    unique, only the positions whose parents lead back to it are yielded
+    :param unique: True to yield every distinct position once instead of
+    every line of play
+    :param symmetric: with unique, True to yield one position per group
+    of rotations and reflections
+    :param depth: most plies to walk below the prefix, None for all
+    :param where: function (game, moves, player) -> bool, only positions
+    it accepts are yielded (their subtrees are still walked)
+    :param shard: (index, count) to walk one shard of count, or None
+    :param split: ply below the prefix whose subtrees are dealt to shards
+    :return: a generator of (moves, player, result) with moves a tuple of
+    the cells played, player the one to move and result as status() gives
+    """
+    game = Game(rows, cols, k)
+    player = first
+    moves = []
+    for cell in prefix:
+        x, y = divmod(cell, cols)
+        if game.game_over() or not game.valid_move(x, y):
+            raise ValueError(f'cannot play cell {cell} after {moves}')
+        game.make_move(x, y, player)
+        moves.append(cell)
+        player = -player
+    root = len(moves)
+    index, count = shard if shard is not None else (0, 1)
+    dealt = 0
+
+    def expand():
+        if status(game) is not None:
+            return iter(())
+        if depth is not None and len(moves) - root >= depth:
+            return iter(())
+        return iter(children(game, player, unique, symmetric))
+
+    if index == 0 and (where is None or where(game, tuple(moves), player)):
+        yield tuple(moves), player, status(game)
+    if split == 0 and index != 0:
+        # The whole tree is below the prefix, which shard 0 has.
+        return
+    stack = [expand()]
+    while stack:
+        cell = next(stack[-1], None)
+        if cell is None:
+            stack.pop()
+            if len(moves) > root:
+                x, y = divmod(moves.pop(), cols)
+                game.unmake_move(x, y)
+                player = -player
+            continue
+
+        x, y = divmod(cell, cols)
+        game.make_move(x, y, player)
+        moves.append(cell)
+        player = -player
+        ply = len(moves) - root
+        if ply == split:
+            dealt += 1
+            if (dealt - 1) % count != index:
+                moves.pop()
+                game.unmake_move(x, y)
+                player = -player
+                continue
+        if (ply >= split or index == 0) and \
+                (where is None or where(game, tuple(moves), player)):
+            yield tuple(moves), player, status(game)
+        stack.append(expand())
+
+
+def summarize(positions):
+    """
+    Counts positions by ply and result
+    :param positions: what walk() yields
+    :return: a dict ply -> {'positions', 'comp_wins', 'human_wins',
+    'draws'}
+    """
+    plies = {}
+    names = {COMP: 'comp_wins', HUMAN: 'human_wins', 0: 'draws'}
+    for moves, player, result in positions:
+        counts = plies.get(len(moves))
+        if counts is None:
+            counts = plies[len(moves)] = {'positions': 0, 'comp_wins': 0,
+                                          'human_wins': 0, 'draws': 0}
+        counts['positions'] += 1
+        if result is not None:
+            counts[names[result]] += 1
+    return dict(sorted(plies.items()))
+
+
+def write_chunks(positions, prefix, chunk_size=100000):
+    """
+    Writes positions to numbered files of at most chunk_size lines, one
+    position per line: the cells played (space separated), the player to
+    move and the result (. while the game goes on), tab separated
+    :param positions: what walk() yields
+    :param prefix: file names are prefix-00000.tsv, prefix-00001.tsv, ...
+    :param chunk_size: most lines per file
+    :return: list of the paths written
+    """
+    paths = []
+    lines = []
+
+    def flush():
+        path = f'{prefix}-{len(paths):05d}.tsv'
+        with open(path, 'w') as output:
+            output.writelines(lines)
+        paths.append(path)
+        lines.clear()
+
+    for moves, player, result in positions:
+        lines.append('{}\t{}\t{}\n'.format(
+            ' '.join(map(str, moves)), player,
+            '.' if result is None else result))
+        if len(lines) == chunk_size:
+            flush()
+    if lines or not paths:
+        flush()
+    return paths
+
+
+def main():
+    """
+    Walks the tree from the command line and prints the counts by ply
+    """
+    parser = argparse.ArgumentParser(description='Game tree enumerator.')
+    parser.add_argument('--size', type=int, nargs=3, default=(3, 3, 3),
+                        metavar=('ROWS', 'COLS', 'K'))
+    parser.add_argument('--first', type=int, default=COMP,
+                        choices=(COMP, HUMAN))
+    parser.add_argument('--unique', action='store_true')
+    parser.add_argument('--symmetric', action='store_true')
+    parser.add_argument('--depth', type=int, default=None)
+    parser.add_argument('--shard', type=int, nargs=2, default=None,
+                        metavar=('INDEX', 'COUNT'))
+    parser.add_argument('--split', type=int, default=2)
+    parser.add_argument('--output', metavar='PREFIX', default=None)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    args = parser.parse_args()
+    positions = walk(*args.size, first=args.first,
+                     unique=args.unique or args.symmetric,
+                     symmetric=args.symmetric, depth=args.depth,
+                     shard=args.shard, split=args.split)
+    if args.output:
+        paths = write_chunks(positions, args.output, args.chunk_size)
+        print(f'Wrote {len(paths)} files')
+    else:
+        print(json.dumps(summarize(positions), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import json
+from time import perf_counter
+"""
+Opt-in instrumentation of the searches.
+
+Give a SearchStats() to an engine (engine.stats = SearchStats()) or to a
+Game for its own minimax() (game.stats = ...) and the search counts the
+nodes it visits (with a histogram by remaining depth), terminal
+evaluations, transposition table hits and cutoffs, and times every move.
+With stats left at None each hook costs the searches one comparison per
+node. SearchStats(trace=True) also records every searched move so the
+tree can be written out with dump_trace().
+"""
+
+
+class SearchStats():
+    def __init__(self, trace=False, on_move=None):
+        """Constructs necessary attributes for the SearchStats class.
+
+        Arguments:
+        self: Represents instance of SearchStats().
+        trace (bool): Record every searched move for dump_trace().
+        on_move (callable): Called with this object after every move.
+
+        Return: None
+        """
+        # self.tracing (bool): Whether searched moves are recorded.
+        self.tracing = trace
+        # self.on_move (callable): Callback after every move, or None.
+        self.on_move = on_move
+        self.reset()
+
+    def __str__(self):
+        """Informal string representation of SearchStats().
+
+        Arguments: self: Represents instance of SearchStats().
+
+        Return: Informal string representing SearchStats().
+        """
+        return """Search statistics of {} moves: {} nodes, {} terminal, {}
+         cache hits, {} cutoffs""".format(
+                len(self.move_times), self.nodes, self.terminals,
+                self.cache_hits, self.cutoffs)
+
+    def reset(self):
+        """Sets every counter back to zero and drops the trace.
+
+        Arguments: self: Represents instance of SearchStats().
+
+        Return: None
+        """
+        # self.nodes (int): Nodes visited.
+        self.nodes = 0
+        # self.terminals (int): Positions scored by evaluate().
+        self.terminals = 0
+        # self.cache_hits (int): Positions answered by the table.
+        self.cache_hits = 0
+        # self.cutoffs (int): Alpha-beta cutoffs.
+        self.cutoffs = 0
+        # self.depths (dict): Remaining depth -> nodes visited there.
+        self.depths = {}
+        # self.move_times (list): Seconds taken by every move.
+        self.move_times = []
+        # self.trace (list): (ply, x, y, score) for every searched move,
+        # in the order the searches returned them.
+        self.trace = []
+        # self.root_depth (int): Depth the current move started at.
+        self.root_depth = 0
+        # self.started (float): perf_counter() at the start of the move.
+        self.started = 0.0
+
+    def begin_move(self, depth):
+        """Marks the start of a search for a move.
+
+        Arguments:
+        self: Represents instance of SearchStats().
+        depth (int): Depth the search starts at.
+
+        Return: None
+        """
+        self.root_depth = depth
+        if self.tracing:
+            self.trace.append(('move', depth))
+        self.started = perf_counter()
+
+    def end_move(self):
+        """Marks the end of a search for a move and calls on_move.
+
+        Arguments: self: Represents instance of SearchStats().
+
+        Return: None
+        """
+        self.move_times.append(perf_counter() - self.started)
+        if self.on_move is not None:
+            self.on_move(self)
+
+    def node(self, depth):
+        """Counts a visited node.
+
+        Arguments:
+        self: Represents instance of SearchStats().
+        depth (int): Remaining depth at the node.
+
+        Return: None
+        """
+        self.nodes += 1
+        self.depths[depth] = self.depths.get(depth, 0) + 1
+
+    def terminal(self):
+        """Counts a position scored by evaluate().
+
+        Arguments: self: Represents instance of SearchStats().
+
+        Return: None
+        """
+        self.terminals += 1
+
+    def hit(self):
+        """Counts a position answered by the transposition table.
+
+        Arguments: self: Represents instance of SearchStats().
+
+        Return: None
+        """
+        self.cache_hits += 1
+
+    def cutoff(self):
+        """Counts an alpha-beta cutoff.
+
+        Arguments: self: Represents instance of SearchStats().
+
+        Return: None
+        """
+        self.cutoffs += 1
+
+    def edge(self, depth, x, y, score):
+        """Records a searched move when tracing.
+
+        Arguments:
+        self: Represents instance of SearchStats().
+        depth (int): Remaining depth before the move.
+        x (int): X coordinate of the move.
+        y (int): Y coordinate of the move.
+        score (number): Score the move got.
+
+        Return: None
+        """
+        if self.tracing:
+            self.trace.append((self.root_depth - depth, x, y, score))
+
+    def report(self):
+        """Counters as a dict, ready for json.dump().
+
+        Arguments: self: Represents instance of SearchStats().
+
+        Return: (dict) the counters, depth histogram and move times.
+        """
+        return {
+            'moves': len(self.move_times),
+            'nodes': self.nodes,
+            'terminals': self.terminals,
+            'cache_hits': self.cache_hits,
+            'cutoffs': self.cutoffs,
+            'depths': {str(depth): count for depth, count
+                       in sorted(self.depths.items(), reverse=True)},
+            'move_seconds': self.move_times,
+        }
+
+    def dump(self, path):
+        """Writes report() to a JSON file.
+
+        Arguments:
+        self: Represents instance of SearchStats().
+        path (str): File to write.
+
+        Return: None
+        """
+        with open(path, 'w') as output:
+            json.dump(self.report(), output, indent=2)
+
+    def dump_trace(self, path):
+        """Writes the recorded moves as an indented tree, one line per move.
+        A move is listed after the moves below it, since a move's score is
+        only known once its subtree is searched.
+
+        Arguments:
+        self: Represents instance of SearchStats().
+        path (str): File to write.
+
+        Return: None
+        """
+        with open(path, 'w') as output:
+            for entry in self.trace:
+                if entry[0] == 'move':
+                    output.write(f'search depth {entry[1]}\n')
+                    continue
+                ply, x, y, score = entry
+                output.write(f'{"  " * (ply + 1)}[{x}, {y}] {score}\n')
@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import base64
+import json
+import secrets
+from random import Random
+from time import perf_counter
+from server import TEXT, encode_frame, read_frame
+from tournament import percentiles
+"""
+Load generator for server.py: opens many connections at once, each
+playing games of random human moves against the server's engine, and
+reports games and requests per second and request latencies.
+
+Usage: python3 loadgen.py [--sessions 1000] [--games 5] [--ws]
+"""
+
+HUMAN = -1
+COMP = +1
+
+
+class HttpClient():
+    def __init__(self, reader, writer, host):
+        """Constructs necessary attributes for the HttpClient class.
+
+        Arguments:
+        self: Represents instance of HttpClient().
+        reader (StreamReader): Incoming side of the connection.
+        writer (StreamWriter): Outgoing side of the connection.
+        host (str): Host header to send.
+
+        Return: None
+        """
+        # self.reader (StreamReader): Incoming side of the connection.
+        self.reader = reader
+        # self.writer (StreamWriter): Outgoing side of the connection.
+        self.writer = writer
+        # self.host (str): Host header to send.
+        self.host = host
+        # self.game_id (str): Id of the game being played.
+        self.game_id = None
+
+    async def call(self, method, path, body):
+        """Sends one request on the keep-alive connection.
+
+        Arguments:
+        self: Represents instance of HttpClient().
+        method (str): HTTP method.
+        path (str): Request path.
+        body (dict): JSON body.
+
+        Return: (dict) the JSON answer.
+        """
+        payload = json.dumps(body).encode()
+        self.writer.write(
+            f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ', 2)[1])
+        size = 0
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                size = int(value)
+        result = json.loads(await self.reader.readexactly(size))
+        if status >= 400:
+            raise RuntimeError(f'{status}: {result.get("error")}')
+        return result
+
+    async def new(self, first):
+        """Starts a game.
+
+        Arguments:
+        self: Represents instance of HttpClient().
+        first (int): The player who moves first.
+
+        Return: (dict) the state of the game.
+        """
+        result = await self.call('POST', '/games', {'first': first})
+        self.game_id = result['id']
+        return result
+
+    async def move(self, x, y):
+        """Plays the human's move.
+
+        Arguments:
+        self: Represents instance of HttpClient().
+        x (int): X coordinate.
+        y (int): Y coordinate.
+
+        Return: (dict) the state after the computer's reply.
+        """
+        return await self.call('POST', f'/games/{self.game_id}/moves',
+                               {'x': x, 'y': y})
+
+
+class WebSocketClient():
+    def __init__(self, reader, writer):
+        """Constructs necessary attributes for the WebSocketClient class.
+
+        Arguments:
+        self: Represents instance of WebSocketClient().
+        reader (StreamReader): Incoming side of the connection, after the
+        handshake.
+        writer (StreamWriter): Outgoing side of the connection.
+
+        Return: None
+        """
+        # self.reader (StreamReader): Incoming side of the connection.
+        self.reader = reader
+        # self.writer (StreamWriter): Outgoing side of the connection.
+        self.writer = writer
+
+    async def call(self, message):
+        """Sends one message and waits for the answer.
+
+        Arguments:
+        self: Represents instance of WebSocketClient().
+        message (dict): The message.
+
+        Return: (dict) the JSON answer.
+        """
+        self.writer.write(encode_frame(TEXT, json.dumps(message).encode(),
+                                       mask=True))
+        opcode, payload = await read_frame(self.reader)
+        result = json.loads(payload)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        return result
+
+    async def new(self, first):
+        """Starts a game.
+
+        Arguments:
+        self: Represents instance of WebSocketClient().
+        first (int): The player who moves first.
+
+        Return: (dict) the state of the game.
+        """
+        return await self.call({'op': 'new', 'first': first})
+
+    async def move(self, x, y):
+        """Plays the human's move.
+
+        Arguments:
+        self: Represents instance of WebSocketClient().
+        x (int): X coordinate.
+        y (int): Y coordinate.
+
+        Return: (dict) the state after the computer's reply.
+        """
+        return await self.call({'op': 'move', 'x': x, 'y': y})
+
+
+async def connect(host, port, ws):
+    """
+    Opens a connection to the server
+    :param host: server address
+    :param port: server port
+    :param ws: True for a WebSocket, False for HTTP
+    :return: an HttpClient or a WebSocketClient
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    if not ws:
+        return HttpClient(reader, writer, f'{host}:{port}')
+    key = base64.b64encode(secrets.token_bytes(16)).decode()
+    writer.write(f'GET /ws HTTP/1.1\r\nHost: {host}:{port}\r\n'
+                 'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+                 f'Sec-WebSocket-Key: {key}\r\n'
+                 'Sec-WebSocket-Version: 13\r\n\r\n'.encode())
+    head = await reader.readuntil(b'\r\n\r\n')
+    if b' 101 ' not in head.split(b'\r\n')[0]:
+        raise RuntimeError('the server refused the WebSocket')
+    return WebSocketClient(reader, writer)
+
+
+async def play_session(host, port, ws, games, rng, totals, latencies):
+    """
+    Plays games one after another on one connection
+    :param host: server address
+    :param port: server port
+    :param ws: True for a WebSocket, False for HTTP
+    :param games: number of games to play
+    :param rng: Random choosing the human's moves
+    :param totals: dict of counters to add the results to
+    :param latencies: list to add request times in milliseconds to
+    """
+    client = await connect(host, port, ws)
+    try:
+        for _ in range(games):
+            start = perf_counter()
+            state = await client.new(rng.choice((HUMAN, COMP)))
+            latencies.append((perf_counter() - start) * 1000)
+            while not state['over']:
+                cells = [(x, y) for x, row in enumerate(state['board'])
+                         for y, cell in enumerate(row) if cell == 0]
+                x, y = rng.choice(cells)
+                start = perf_counter()
+                state = await client.move(x, y)
+                latencies.append((perf_counter() - start) * 1000)
+            totals[state['winner']] += 1
+    finally:
+        client.writer.close()
+
+
+async def run_load(host='127.0.0.1', port=8080, sessions=100, games=5,
+                   ws=False, seed=0):
+    """
+    Plays games on many connections at once
+    :param host: server address
+    :param port: server port
+    :param sessions: number of simultaneous connections
+    :param games: games played on each connection
+    :param ws: True for WebSockets, False for HTTP
+    :param seed: seed of the human's moves
+    :return: a dict with the results, errors, request latency
+    percentiles in milliseconds and games and requests per second
+    """
+    totals = {HUMAN: 0, COMP: 0, 0: 0}
+    latencies = []
+    start = perf_counter()
+    outcomes = await asyncio.gather(
+        *(play_session(host, port, ws, games, Random(seed * 1000003 + n),
+                       totals, latencies) for n in range(sessions)),
+        return_exceptions=True)
+    elapsed = perf_counter() - start
+    errors = [outcome for outcome in outcomes
+              if isinstance(outcome, BaseException)]
+    played = sum(totals.values())
+    return {
+        'sessions': sessions,
+        'games': played,
+        'results': {'human_wins': totals[HUMAN], 'comp_wins': totals[COMP],
+                    'draws': totals[0]},
+        'errors': len(errors),
+        'first_error': repr(errors[0]) if errors else None,
+        'requests': len(latencies),
+        'latency_ms': percentiles(latencies),
+        'seconds': elapsed,
+        'games_per_second': played / elapsed if elapsed else None,
+        'requests_per_second': len(latencies) / elapsed if elapsed else None,
+    }
+
+
+def main():
+    """
+    Runs the load generator from the command line and prints its report
+    """
+    parser = argparse.ArgumentParser(description='Game server load test.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--games', type=int, default=5)
+    parser.add_argument('--ws', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    report = asyncio.run(run_load(args.host, args.port, args.sessions,
+                                  args.games, args.ws, args.seed))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
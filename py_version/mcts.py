@@ -0,0 +1,399 @@
+from math import log, sqrt
+from random import Random
+from time import perf_counter
+"""
+Monte Carlo tree search engine (UCT) for boards too big for minimax.
+
+Every iteration walks down the tree by the UCT rule, adds one new
+position, finishes the game from there with random moves (a playout)
+and credits the result to every position on the way. The engine plays
+the most visited move once it has run its playouts or its time budget.
+Playouts play and take back moves on the Game itself with make_move()
+and unmake_move(), so they cost no copies.
+
+The tree is kept between searches: the next search starts from the node
+of the moves played since, if the tree has them. With workers, each of
+that many processes grows its own tree from the same position and the
+visits of the root moves are added up (root parallelization).
+"""
+
+# Score of a playout for the player who made a move: won or drawn.
+WIN, DRAW = 1.0, 0.5
+
+# worker_engines (dict): Token of an engine -> MCTSEngine of this worker
+# process, kept between searches so its tree can be reused.
+worker_engines = {}
+
+
+class Node():
+    __slots__ = ('move', 'mover', 'visits', 'score', 'children', 'untried',
+                 'winner')
+
+    def __init__(self, move, mover, untried, winner=None):
+        """Constructs necessary attributes for the Node class.
+
+        Arguments:
+        self: Represents instance of Node().
+        move (tuple): (x, y) played to reach the node, None at the root.
+        mover (int): The player who played it.
+        untried (list): Moves not yet expanded, empty once over.
+        winner (int): The player who won, 0 for a draw, None if open.
+
+        Return: None
+        """
+        # self.move (tuple): (x, y) played to reach the node.
+        self.move = move
+        # self.mover (int): The player who played it.
+        self.mover = mover
+        # self.visits (int): Playouts through the node.
+        self.visits = 0
+        # self.score (float): Sum of their scores for the mover.
+        self.score = 0.0
+        # self.children (list): Expanded child nodes.
+        self.children = []
+        # self.untried (list): Moves not yet expanded.
+        self.untried = untried
+        # self.winner (int): Result if the game is over here, else None.
+        self.winner = winner
+
+    def __str__(self):
+        """Informal string representation of Node().
+
+        Arguments: self: Represents instance of Node().
+
+        Return: Informal string representing Node().
+        """
+        return 'A search tree node after {} with {} visits'.format(
+                self.move, self.visits)
+
+
+def search_share(token, game_class, shape, state, player, playouts,
+                 budget_ms, exploration, seed):
+    """
+    Runs one process's share of a root-parallel search
+    :param token: id of the engine, to find its tree again
+    :param game_class: class of the game, Game of oominimax.py
+    :param shape: (rows, cols, k) of the game
+    :param state: the state of the current board
+    :param player: the player to move
+    :param playouts: playouts to run
+    :param budget_ms: time budget in milliseconds, or None
+    :param exploration: UCT exploration constant
+    :param seed: seed of this share
+    :return: a dict (x, y) -> [visits, score] of the root moves
+    """
+    engine = worker_engines.get(token)
+    if engine is None:
+        engine = worker_engines[token] = MCTSEngine(playouts, budget_ms,
+                                                    exploration)
+    engine.rng.seed(seed)
+    game = game_class(*shape)
+    game.set_state([row[:] for row in state])
+    root = engine.grow(game, player)
+    return {child.move: [child.visits, child.score]
+            for child in root.children}
+
+
+class MCTSEngine():
+    def __init__(self, playouts=1000, budget_ms=None, exploration=1.4,
+                 workers=0, seed=None):
+        """Constructs necessary attributes for the MCTSEngine class.
+
+        Arguments:
+        self: Represents instance of MCTSEngine().
+        playouts (int): Playouts per search, split between the workers.
+        budget_ms (number): Time a search may take in milliseconds, or
+        None to only count playouts.
+        exploration (float): UCT exploration constant.
+        workers (int): Extra processes searching the root in parallel, 0
+        for none.
+        seed (int): Seed of the playouts.
+
+        Return: None
+        """
+        if playouts < 1:
+            raise ValueError('playouts must be positive')
+        # self.playouts (int): Playouts per search.
+        self.playouts = playouts
+        # self.budget_ms (number): Time budget in milliseconds, or None.
+        self.budget_ms = budget_ms
+        # self.exploration (float): UCT exploration constant.
+        self.exploration = exploration
+        # self.workers (int): Extra processes of a search.
+        self.workers = workers
+        # self.rng (Random): Generator of the playouts.
+        self.rng = Random(seed)
+        # self.root (Node): Tree of the last search, or None.
+        self.root = None
+        # self.root_state (list): Flat board the tree's root stands for.
+        self.root_state = None
+        # self.pool (ProcessPoolExecutor): Workers, started on first use.
+        self.pool = None
+        # self.searches (int): Number of searches so far.
+        self.searches = 0
+        # self.nodes (int): Playouts run by the last search.
+        self.nodes = 0
+        # self.stats (SearchStats): Instrumentation, or None.
+        self.stats = None
+
+    def __str__(self):
+        """Informal string representation of MCTSEngine().
+
+        Arguments: self: Represents instance of MCTSEngine().
+
+        Return: Informal string representing MCTSEngine().
+        """
+        return 'A Monte Carlo tree search engine with {} playouts'.format(
+                self.playouts)
+
+    def __enter__(self):
+        """Using the engine in a with statement closes its workers after.
+
+        Arguments: self: Represents instance of MCTSEngine().
+
+        Return: self
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the workers at the end of a with statement.
+
+        Arguments: self: Represents instance of MCTSEngine().
+
+        Return: None
+        """
+        self.close()
+
+    def close(self):
+        """Shuts the worker processes down.
+
+        Arguments: self: Represents instance of MCTSEngine().
+
+        Return: None
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def seed(self, seed):
+        """Reseeds the playouts.
+
+        Arguments:
+        self: Represents instance of MCTSEngine().
+        seed (int): The new seed.
+
+        Return: None
+        """
+        self.rng.seed(seed)
+
+    def search(self, game, depth, player):
+        """Picks the most visited move after the playouts.
+
+        Arguments:
+        self: Represents instance of MCTSEngine().
+        game (Game): Game to search, restored on return.
+        depth (int): Unused, playouts always finish the game.
+        player (int): The player to move.
+
+        Return: (list) [the best row, best col, estimated score], the
+        score between -1 and +1 from the computer's point of view.
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.begin_move(depth)
+        self.searches += 1
+        if game.game_over() or not game.empty_cells():
+            if stats is not None:
+                stats.end_move()
+            return [-1, -1, game.evaluate()]
+
+        if self.workers:
+            moves = self.parallel(game, player)
+        else:
+            root = self.grow(game, player)
+            moves = {child.move: [child.visits, child.score]
+                     for child in root.children}
+        move = max(moves, key=lambda cell: moves[cell][0])
+        visits, score = moves[move]
+        if stats is not None:
+            stats.end_move()
+        return [move[0], move[1], player * (2 * score / visits - 1)]
+
+    def parallel(self, game, player):
+        """Splits the playouts between this process and the workers.
+
+        Arguments:
+        self: Represents instance of MCTSEngine().
+        game (Game): Game to search.
+        player (int): The player to move.
+
+        Return: (dict) (x, y) -> [visits, score] summed over the trees.
+        """
+        if self.pool is None:
+            # Imported here, since search.py imports this module and
+            # most engines never start processes.
+            from concurrent.futures import ProcessPoolExecutor
+            self.pool = ProcessPoolExecutor(self.workers)
+        share = max(1, self.playouts // (self.workers + 1))
+        shape = (game.rows, game.cols, game.k)
+        state = [row[:] for row in game.get_state()]
+        base = self.rng.getrandbits(32)
+        futures = [self.pool.submit(search_share, (id(self), index),
+                                    type(game), shape, state, player,
+                                    share, self.budget_ms, self.exploration,
+                                    base + index)
+                   for index in range(self.workers)]
+        root = self.grow(game, player, share)
+        moves = {child.move: [child.visits, child.score]
+                 for child in root.children}
+        for future in futures:
+            for move, (visits, score) in future.result().items():
+                total = moves.setdefault(move, [0, 0.0])
+                total[0] += visits
+                total[1] += score
+        return moves
+
+    def reuse(self, game, player):
+        """Finds the node of the current position in the last tree.
+
+        Arguments:
+        self: Represents instance of MCTSEngine().
+        game (Game): Game to search.
+        player (int): The player to move.
+
+        Return: (Node) the node, or None if the tree does not have it.
+        """
+        if self.root is None:
+            return None
+        state = [cell for row in game.get_state() for cell in row]
+        old = self.root_state
+        if len(old) != len(state):
+            return None
+        played = {}
+        for cell, (before, after) in enumerate(zip(old, state)):
+            if before != after:
+                if before != 0:
+                    return None
+                played[after] = played.get(after, []) + [cell]
+        node = self.root
+        cols = game.cols
+        while played.get(-node.mover):
+            cells = played[-node.mover]
+            for child in node.children:
+                if child.move[0] * cols + child.move[1] in cells:
+                    break
+            else:
+                return None
+            cells.remove(child.move[0] * cols + child.move[1])
+            node = child
+        if any(played.values()) or node.mover != -player:
+            return None
+        return node
+
+    def grow(self, game, player, playouts=None):
+        """Runs the playouts of a search on this process's tree.
+
+        Arguments:
+        self: Represents instance of MCTSEngine().
+        game (Game): Game to search, restored on return.
+        player (int): The player to move.
+        playouts (int): Playouts to run, self.playouts if None.
+
+        Return: (Node) the root of the tree.
+        """
+        root = self.reuse(game, player)
+        if root is None:
+            root = Node(None, -player,
+                        [tuple(cell) for cell in game.empty_cells()])
+        root.move = None
+        self.root = root
+        self.root_state = [cell for row in game.get_state() for cell in row]
+
+        limit = playouts or self.playouts
+        deadline = None
+        if self.budget_ms is not None:
+            deadline = perf_counter() + self.budget_ms / 1000
+        self.nodes = 0
+        while self.nodes < limit:
+            if deadline is not None and self.nodes % 16 == 0 \
+                    and perf_counter() > deadline and root.children:
+                break
+            self.iterate(game, root)
+            self.nodes += 1
+        return root
+
+    def iterate(self, game, root):
+        """Runs one selection, expansion, playout and backup.
+
+        Arguments:
+        self: Represents instance of MCTSEngine().
+        game (Game): Game to search, restored on return.
+        root (Node): Root of the tree.
+
+        Return: None
+        """
+        rng = self.rng
+        cells = game.rows * game.cols
+        node = root
+        path = [root]
+        # Selection: follow UCT while every move of the node is expanded.
+        while not node.untried and node.children:
+            factor = self.exploration * sqrt(log(node.visits))
+            best, best_value = None, -1.0
+            for child in node.children:
+                value = child.score / child.visits \
+                    + factor / sqrt(child.visits)
+                if value > best_value:
+                    best, best_value = child, value
+            node = best
+            game.make_move(node.move[0], node.move[1], node.mover)
+            path.append(node)
+
+        # Expansion: add one untried move.
+        if node.untried and node.winner is None:
+            index = rng.randrange(len(node.untried))
+            move = node.untried[index]
+            node.untried[index] = node.untried[-1]
+            node.untried.pop()
+            mover = -node.mover
+            winner = None
+            if game.make_move(move[0], move[1], mover):
+                winner = mover
+            elif game.filled == cells:
+                winner = 0
+            untried = [] if winner is not None else \
+                [tuple(cell) for cell in game.empty_cells()]
+            child = Node(move, mover, untried, winner)
+            node.children.append(child)
+            node = child
+            path.append(node)
+
+        # Playout: random moves to the end of the game.
+        winner = node.winner
+        played = []
+        if winner is None:
+            empty = game.empty_cells()
+            mover = node.mover
+            while winner is None:
+                mover = -mover
+                index = rng.randrange(len(empty))
+                x, y = empty[index]
+                empty[index] = empty[-1]
+                empty.pop()
+                played.append((x, y))
+                if game.make_move(x, y, mover):
+                    winner = mover
+                elif not empty:
+                    winner = 0
+        for x, y in reversed(played):
+            game.unmake_move(x, y)
+
+        # Backup, and take back the moves of the path.
+        for step in path:
+            step.visits += 1
+            if winner == 0:
+                step.score += DRAW
+            elif winner == step.mover:
+                step.score += WIN
+        for step in reversed(path[1:]):
+            game.unmake_move(step.move[0], step.move[1])
@@ -1,9 +1,6 @@
 from math import inf as infinity
 from random import choice
 from random import seed as randomseed       # Paul Lu
-import platform
-import time
-from os import system
 
 """
 An implementation of Minimax AI Algorithm in Tic Tac Toe,
@@ -19,6 +16,14 @@ CCID: khlynovs
 
 HUMAN = -1
 COMP = +1
+# Cells in the order alpha-beta tries them: center, corners, then edges.
+MOVE_ORDER = [
+    [1, 1],
+    [0, 0], [0, 2], [2, 0], [2, 2],
+    [0, 1], [1, 0], [1, 2], [2, 1],
+]
+# Number of nodes visited by the searches, reset by the caller.
+nodes = 0
 board = [
     [0, 0, 0],
     [0, 0, 0],
@@ -129,6 +134,8 @@ def minimax(state, depth, player):
     :param player: an human or a computer
     :return: a list with [the best row, best col, best score]
     """
+    global nodes
+    nodes += 1
     if player == COMP:
         best = [-1, -1, -infinity]
     else:
@@ -155,6 +162,91 @@ def minimax(state, depth, player):
     return best
 
 
+def alphabeta(state, depth, player):
+    """
+    AI function that choice the same move as minimax() with alpha-beta
+    cutoffs. The moves at the root are tried in row-major order so ties
+    are broken exactly like minimax() does.
+    :param state: current state of the board
+    :param depth: node index in the tree (0 <= depth <= 9)
+    :param player: an human or a computer
+    :return: a list with [the best row, best col, best score]
+    """
+    global nodes
+    nodes += 1
+    if depth == 0 or game_over(state):
+        return [-1, -1, evaluate(state)]
+
+    if player == COMP:
+        best = [-1, -1, -infinity]
+    else:
+        best = [-1, -1, +infinity]
+
+    for cell in empty_cells(state):
+        x, y = cell[0], cell[1]
+        state[x][y] = player
+        if player == COMP:
+            score = alphabeta_score(state, depth - 1, -player,
+                                    best[2], +infinity)
+        else:
+            score = alphabeta_score(state, depth - 1, -player,
+                                    -infinity, best[2])
+        state[x][y] = 0
+
+        if player == COMP:
+            if score > best[2]:
+                best = [x, y, score]  # max value
+        else:
+            if score < best[2]:
+                best = [x, y, score]  # min value
+
+    return best
+
+
+def alphabeta_score(state, depth, player, alpha, beta):
+    """
+    Scores a state with alpha-beta cutoffs, trying the center first,
+    then the corners, then the edges
+    :param state: current state of the board
+    :param depth: node index in the tree (0 <= depth <= 9)
+    :param player: an human or a computer
+    :param alpha: score the computer is already guaranteed
+    :param beta: score the human is already guaranteed
+    :return: the score of the state
+    """
+    global nodes
+    nodes += 1
+    if depth == 0 or game_over(state):
+        return evaluate(state)
+
+    if player == COMP:
+        best = -infinity
+    else:
+        best = +infinity
+
+    for x, y in MOVE_ORDER:
+        if state[x][y] != 0:
+            continue
+        state[x][y] = player
+        score = alphabeta_score(state, depth - 1, -player, alpha, beta)
+        state[x][y] = 0
+
+        if player == COMP:
+            best = max(best, score)
+            alpha = max(alpha, best)
+        else:
+            best = min(best, score)
+            beta = min(beta, best)
+        if alpha >= beta:
+            break
+
+    return best
+
+
+# Search function ai_turn() uses, minimax or alphabeta.
+search = minimax
+
+
 def clean():
     """
     Clears the console
@@ -163,6 +255,10 @@ def clean():
     print()
     return
 
+    # Only a console needs these, so they are not imported with the
+    # module.
+    import platform
+    from os import system
     os_name = platform.system().lower()
     if 'windows' in os_name:
         system('cls')
@@ -211,7 +307,7 @@ def ai_turn(c_choice, h_choice):
         x = choice([0, 1, 2])
         y = choice([0, 1, 2])
     else:
-        move = minimax(board, depth, COMP)
+        move = search(board, depth, COMP)
         x, y = move[0], move[1]
 
     set_move(x, y, COMP)
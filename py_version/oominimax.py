@@ -1,9 +1,11 @@
 from math import inf as infinity
 from random import choice
 from random import seed as randomseed
-import platform
-import time
-from os import system
+from operator import xor
+from transposition import TranspositionTable, EXACT
+from search import MinimaxEngine
+from symmetry import first_cell, restore_mask, transform_mask
+from zobrist import keys, symmetric_keys
 """
 An implementation of Minimax AI Algorithm in Tic Tac Toe,
 using Python.
@@ -16,27 +18,96 @@ Sergey Khlynovskiy
 CCID: khlynovs
 """
 
+# Base of the open-line weights used by Game.heuristic(): a line holding
+# one more of a player's pieces is worth this many times more.
+LINE_WEIGHT = 10
+
+
+def win_lines(rows, cols, k):
+    """
+    Every line of k cells in a row on a rows x cols board
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: a list of lines, each a tuple of (x, y) cells
+    """
+    lines = []
+    for dx, dy in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for x in range(rows):
+            for y in range(cols):
+                end_x, end_y = x + dx * (k - 1), y + dy * (k - 1)
+                if 0 <= end_x < rows and 0 <= end_y < cols:
+                    lines.append(tuple((x + dx * i, y + dy * i)
+                                       for i in range(k)))
+    return lines
+
 
 class Game():
-    def __init__(self):
+    def __init__(self, rows=3, cols=3, k=3):
         """Constructs necessary attributes for the Game class.
 
-        Arguments: self: Represents instance of Game()
+        Arguments:
+        self: Represents instance of Game()
+        rows (int): Number of rows of the board.
+        cols (int): Number of cols of the board.
+        k (int): Number of pieces in a row needed to win.
 
         Return: None
         """
+        if rows < 1 or cols < 1 or not 1 <= k <= max(rows, cols):
+            raise ValueError(f'no {k} in a row on a {rows}x{cols} board')
+        # self.rows (int): Number of rows of the board.
+        self.rows = rows
+        # self.cols (int): Number of cols of the board.
+        self.cols = cols
+        # self.k (int): Number of pieces in a row needed to win.
+        self.k = k
+        # self.lines (list): Every winning line as a tuple of (x, y).
+        self.lines = win_lines(rows, cols, k)
+        # self.cell_lines (nested list): Indexes in self.lines of the
+        # lines through each cell.
+        self.cell_lines = [[[] for y in range(cols)] for x in range(rows)]
+        for index, line in enumerate(self.lines):
+            for x, y in line:
+                self.cell_lines[x][y].append(index)
+        # self.base_key (int): Zobrist number of the variant, in every
+        # key of its positions.
+        # self.side_key (int): Zobrist number of the computer to move.
+        # self.cell_keys (nested list): [x][y][player] -> the Zobrist
+        # numbers of the move as seen through every board symmetry.
+        self.base_key, self.side_key = keys(rows, cols, k)[:2]
+        self.cell_keys = symmetric_keys(rows, cols, k)
+        # self.search_depth (int): Most plies ai_turn() searches ahead,
+        # or None to search to the end of the game.
+        self.search_depth = None
         # self.board (nested list): How the tic-tac-toe board looks.
-        self.board = [
-                      [0, 0, 0],
-                      [0, 0, 0],
-                      [0, 0, 0],
-                      ]
+        self.board = [[0] * cols for x in range(rows)]
         # self.HUMAN (int): Value to represent a human.
         self.HUMAN = -1
         # self.COMP (int): Value to represent computer.
         self.COMP = 1
         # self.state (nested list): Current state of the board.
         self.set_state(self.board)
+        # self.table (TranspositionTable): Results of positions already
+        # searched by minimax(), or None to always search in full.
+        self.set_table(TranspositionTable())
+        # self.engine (object): Engine ai_turn() searches with, anything
+        # with a search(game, depth, player) method.
+        self.set_engine(MinimaxEngine())
+        # self.nodes (int): Number of nodes minimax() has visited.
+        self.nodes = 0
+        # self.stats (SearchStats): Instrumentation minimax() reports to,
+        # or None.
+        self.stats = None
+        # self.searching (bool): Whether a minimax() search is running,
+        # so that only its outermost call times the move.
+        self.searching = False
+        # self.book (OpeningBook): Solved table ai_turn() looks moves up
+        # in before searching, or None.
+        self.set_book(None)
+        # self.console (Console): Console the turns print to, made the
+        # first time a turn prints.
+        self.console = None
 
     def __str__(self):
         """Informal string representation of Game().
@@ -64,6 +135,10 @@ class Game():
     def set_state(self, state):
         """Setting current state of the game.
 
+        The board becomes state as well, and the line counters are
+        rebuilt from it; call set_state() again after writing to the
+        nested list directly instead of through make_move().
+
         Arguments:
         self: Represents instance of Game().
         state (nested list): Current state of the game.
@@ -72,6 +147,40 @@ class Game():
         """
         # self.state (nested list): Construction of state.
         self.state = state
+        self.board = state
+        self.recount()
+
+    def recount(self):
+        """Rebuilds the line counters from the board.
+
+        Arguments:
+        self: Represents instance of Game().
+
+        Return: None
+        """
+        # self.counts (dict): Player -> number of the player's pieces on
+        # each line of self.lines.
+        self.counts = {self.COMP: [0] * len(self.lines),
+                       self.HUMAN: [0] * len(self.lines)}
+        # self.completed (dict): Player -> number of lines the player has
+        # filled; above 0 means the player wins.
+        self.completed = {self.COMP: 0, self.HUMAN: 0}
+        # self.filled (int): Number of cells that are not empty.
+        self.filled = 0
+        # self.hashes (list): Zobrist key of the board seen through each
+        # symmetry, the plain board first.
+        self.hashes = [self.base_key] * len(self.cell_keys[0][0][self.COMP])
+        for x, row in enumerate(self.state):
+            for y, cell in enumerate(row):
+                if cell != 0:
+                    self.filled += 1
+                    self.hashes = list(map(xor, self.hashes,
+                                           self.cell_keys[x][y][cell]))
+                    counts = self.counts[cell]
+                    for index in self.cell_lines[x][y]:
+                        counts[index] += 1
+        for player, counts in self.counts.items():
+            self.completed[player] = counts.count(self.k)
 
     def get_state(self):
         """Getting the current state of the game.
@@ -83,6 +192,124 @@ class Game():
         """
         return self.state
 
+    def set_table(self, table):
+        """Setting the transposition table used by minimax().
+
+        Arguments:
+        self: Represents instance of Game().
+        table (TranspositionTable): Table to use, or None to disable it.
+
+        Return: None
+        """
+        max_cells = getattr(table, 'max_cells', None)
+        if max_cells is not None and self.rows * self.cols > max_cells:
+            raise ValueError(f'the table holds boards of at most '
+                             f'{max_cells} cells')
+        self.table = table
+
+    def get_table(self):
+        """Getting the transposition table used by minimax().
+
+        Arguments:
+        self: Represents instance of Game().
+
+        Return: self.table (TranspositionTable): Table in use, or None.
+        """
+        return self.table
+
+    def set_engine(self, engine):
+        """Setting the search engine used by ai_turn().
+
+        Arguments:
+        self: Represents instance of Game().
+        engine (object): Engine with a search(game, depth, player) method.
+
+        Return: None
+        """
+        self.engine = engine
+
+    def get_engine(self):
+        """Getting the search engine used by ai_turn().
+
+        Arguments:
+        self: Represents instance of Game().
+
+        Return: self.engine (object): Engine in use.
+        """
+        return self.engine
+
+    def set_book(self, book):
+        """Setting the solved table used by ai_turn().
+
+        Arguments:
+        self: Represents instance of Game().
+        book (OpeningBook): Table with a lookup(state, player) method and
+        the (rows, cols, k) shape it was solved for, or None to always
+        search.
+
+        Return: None
+        """
+        if book is not None and \
+                tuple(book.shape) != (self.rows, self.cols, self.k):
+            raise ValueError(f'book solved for {book.shape}, not for '
+                             f'{(self.rows, self.cols, self.k)}')
+        self.book = book
+
+    def get_book(self):
+        """Getting the solved table used by ai_turn().
+
+        Arguments:
+        self: Represents instance of Game().
+
+        Return: self.book (OpeningBook): Table in use, or None.
+        """
+        return self.book
+
+    def get_console(self):
+        """Getting the console ai_turn() and human_turn() print to.
+
+        Arguments:
+        self: Represents instance of Game().
+
+        Return: self.console (Console): The console, made on first use.
+        """
+        if self.console is None:
+            self.console = Console()
+        return self.console
+
+    def zobrist_key(self, player=None):
+        """Zobrist key of the current state, kept up to date by
+        make_move() and unmake_move(). It is the same in every process,
+        so it can be stored on disk.
+
+        Arguments:
+        self: Represents instance of Game().
+        player (int): The player to move, or None to leave it out.
+
+        Return: key (int): 64-bit key of the current state.
+        """
+        if player == self.COMP:
+            return self.hashes[0] ^ self.side_key
+        return self.hashes[0]
+
+    def table_key(self, player):
+        """Zobrist key of the symmetry representative of the current
+        state, the smallest key among its rotations and reflections.
+
+        Arguments:
+        self: Represents instance of Game().
+        player (int): The player to move.
+
+        Return: (key, t) the 64-bit key with the player to move and the
+        index of the symmetry that gives the representative.
+        """
+        hashes = self.hashes
+        key = min(hashes)
+        sym = hashes.index(key)
+        if player == self.COMP:
+            key ^= self.side_key
+        return key, sym
+
     def get_HUMAN(self):
         """Getting value that represents a human.
 
@@ -117,41 +344,49 @@ class Game():
         """
         Function to heuristic evaluation of state.
         :param state: the state of the current board
-        :return: +1 if the computer wins; -1 if the human wins; 0 draw
+        :return: +1 if the computer wins; -1 if the human wins; otherwise
+        heuristic(), which is 0 on a full board
         """
         if self.wins(self.COMP):
             score = +1
         elif self.wins(self.HUMAN):
             score = -1
         else:
-            score = 0
+            score = self.heuristic()
 
         return score
 
+    def heuristic(self):
+        """
+        Scores a position nobody has won yet by counting open lines, the
+        lines still free of the opponent's pieces. An open line holding n
+        pieces is worth LINE_WEIGHT ** (n - 1)
+        :param state: the state of the current board
+        :return: a score strictly between -1 and +1, positive when the
+        computer has the better open lines
+        """
+        score = 0
+        for comp, human in zip(self.counts[self.COMP],
+                               self.counts[self.HUMAN]):
+            if human == 0 and comp > 0:
+                score += LINE_WEIGHT ** (comp - 1)
+            elif comp == 0 and human > 0:
+                score -= LINE_WEIGHT ** (human - 1)
+
+        if score == 0:
+            return 0
+        return score / (len(self.lines) * LINE_WEIGHT ** (self.k - 1))
+
     def wins(self, player):
         """
-        This function tests if a specific player wins. Possibilities:
-        * Three rows    [X X X] or [O O O]
-        * Three cols    [X X X] or [O O O]
-        * Two diagonals [X X X] or [O O O]
+        This function tests if a specific player wins, that is fills one
+        of the lines of k cells in self.lines: rows, cols or diagonals.
+        The line counters kept by make_move() answer it without a scan
         :param state: the state of the current board
         :param player: a human or a computer
         :return: True if the player wins
         """
-        win_state = [
-            [self.state[0][0], self.state[0][1], self.state[0][2]],
-            [self.state[1][0], self.state[1][1], self.state[1][2]],
-            [self.state[2][0], self.state[2][1], self.state[2][2]],
-            [self.state[0][0], self.state[1][0], self.state[2][0]],
-            [self.state[0][1], self.state[1][1], self.state[2][1]],
-            [self.state[0][2], self.state[1][2], self.state[2][2]],
-            [self.state[0][0], self.state[1][1], self.state[2][2]],
-            [self.state[2][0], self.state[1][1], self.state[0][2]],
-        ]
-        if [player, player, player] in win_state:
-            return True
-        else:
-            return False
+        return self.completed[player] > 0
 
     def game_over(self):
         """
@@ -159,7 +394,7 @@ class Game():
         :param state: the state of the current board
         :return: True if the human or computer wins
         """
-        return self.wins(self.HUMAN) or self.wins(self.COMP)
+        return self.completed[self.HUMAN] > 0 or self.completed[self.COMP] > 0
 
     def empty_cells(self):
         """
@@ -180,40 +415,85 @@ class Game():
         """
         AI function that choice the best move
         :param state: current state of the board
-        :param depth: node index in the tree (0 <= depth <= 9),
-        but never nine in this case (see iaturn() function)
+        :param depth: node index in the tree (0 <= depth <= number of
+        empty cells), evaluate() scores the position once it reaches 0
         :param player: an human or a computer
         :return: a list with [the best row, best col, best score]
         """
+        stats = self.stats
+        if stats is not None:
+            if not self.searching:
+                stats.begin_move(depth)
+                self.searching = True
+                try:
+                    return self.minimax(depth, player)
+                finally:
+                    self.searching = False
+                    stats.end_move()
+            stats.node(depth)
+        self.nodes += 1
         if player == self.COMP:
             best = [-1, -1, -infinity]
         else:
             best = [-1, -1, +infinity]
 
         if depth == 0 or self.game_over():
+            if stats is not None:
+                stats.terminal()
             score = self.evaluate()
             return [-1, -1, score]
 
+        # The same position is reached through many move orders and as a
+        # rotation or reflection of other positions, so reuse the result
+        # of an earlier search of its symmetry representative. The table
+        # keeps every move with the best score, mapped back here to pick
+        # the first one in row-major order like the loop below does. A
+        # search to another depth scores its leaves differently, so only
+        # results of the same depth are reused.
+        table = self.table
+        if table is not None:
+            key, sym = self.table_key(player)
+            entry = table.probe(key)
+            if entry is not None and entry[0] == depth and entry[1] == EXACT:
+                if stats is not None:
+                    stats.hit()
+                mask = restore_mask(entry[3], sym, self.rows, self.cols)
+                move = first_cell(mask, self.cols)
+                return [move[0], move[1], entry[2]]
+
+        # optimal (int): Mask of the cells that reach the best score.
+        optimal = 0
         for cell in self.empty_cells():
             x, y = cell[0], cell[1]
-            self.state[x][y] = player
+            self.make_move(x, y, player)
             score = self.minimax(depth - 1, -player)
-            self.state[x][y] = 0
+            self.unmake_move(x, y)
             score[0], score[1] = x, y
+            if stats is not None:
+                stats.edge(depth, x, y, score[2])
 
             if player == self.COMP:
                 if score[2] > best[2]:
                     best = score  # max value
+                    optimal = 0
             else:
                 if score[2] < best[2]:
                     best = score  # min value
-
+                    optimal = 0
+            if score[2] == best[2]:
+                optimal |= 1 << (x * self.cols + y)
+
+        # A full board has no move to store; it is searched again, which
+        # costs nothing.
+        if table is not None and optimal:
+            table.store(key, depth, EXACT, best[2],
+                        transform_mask(optimal, sym, self.rows, self.cols))
         return best
 
     def ai_turn(self, c_choice, h_choice):
         """
-        It calls the minimax function if the depth < 9,
-        else it choices a random coordinate.
+        It calls the minimax function, at most search_depth plies deep,
+        unless the board is empty, then it choices a random coordinate.
         :param c_choice: computer's choice X or O
         :param h_choice: human's choice X or O
         :return:
@@ -222,24 +502,40 @@ class Game():
         if depth == 0 or self.game_over():
             return
 
-        # term (object): Instance of Console() class so its methods
-        # can be used.
-        term = Console()
+        term = self.get_console()
         term.clean()
         print(f'Computer turn [{c_choice}]')
         term.render(self.get_state(), c_choice, h_choice)
 
-        if depth == 9:
-            x = choice([0, 1, 2])
-            y = choice([0, 1, 2])
-        else:
-            move = self.minimax(depth, self.COMP)
-            x, y = move[0], move[1]
-
+        x, y = self.choose_move(self.COMP)
         self.set_move(x, y, self.COMP)
         # Paul Lu.  Go full speed.
         # time.sleep(1)
 
+    def choose_move(self, player):
+        """
+        Picks a move without playing it or printing anything: a random
+        coordinate on an empty board, else the book move if the book has
+        the position, else the engine's move searched at most
+        search_depth plies deep
+        :param player: the player to move
+        :return: a list [x, y]
+        """
+        depth = len(self.empty_cells())
+        if depth == self.rows * self.cols:
+            x = choice(range(self.rows))
+            y = choice(range(self.cols))
+            return [x, y]
+
+        if self.search_depth is not None:
+            depth = min(depth, self.search_depth)
+        move = None
+        if self.book is not None:
+            move = self.book.lookup(self.state, player)
+        if move is None:
+            move = self.engine.search(self, depth, player)
+        return [move[0], move[1]]
+
     def human_turn(self, c_choice, h_choice):
         """
         The Human plays choosing a valid move.
@@ -251,24 +547,23 @@ class Game():
         if depth == 0 or self.game_over():
             return
 
-        # Dictionary of valid moves
+        # Dictionary of valid moves, numbered in row-major order like a
+        # numpad on the 3x3 board
         move = -1
-        moves = {
-            1: [0, 0], 2: [0, 1], 3: [0, 2],
-            4: [1, 0], 5: [1, 1], 6: [1, 2],
-            7: [2, 0], 8: [2, 1], 9: [2, 2],
-        }
+        last = self.rows * self.cols
+        moves = {}
+        for number in range(1, last + 1):
+            moves[number] = [(number - 1) // self.cols,
+                             (number - 1) % self.cols]
 
-        # term (object): Instance of Console() class so its methods
-        # can be used.
-        term = Console()
+        term = self.get_console()
         term.clean()
         print(f'Human turn [{h_choice}]')
         term.render(self.get_state(), c_choice, h_choice)
 
-        while move < 1 or move > 9:
+        while move < 1 or move > last:
             try:
-                move = int(input('Use numpad (1..9): '))
+                move = int(input(f'Use numpad (1..{last}): '))
                 coord = moves[move]
                 can_move = self.set_move(coord[0], coord[1], self.HUMAN)
 
@@ -288,10 +583,8 @@ class Game():
         :param y: Y coordinate
         :return: True if the board[x][y] is empty
         """
-        if [x, y] in self.empty_cells():
-            return True
-        else:
-            return False
+        return 0 <= x < self.rows and 0 <= y < self.cols \
+            and self.state[x][y] == 0
 
     def set_move(self, x, y, player):
         """
@@ -301,11 +594,50 @@ class Game():
         :param player: the current player
         """
         if self.valid_move(x, y):
-            self.board[x][y] = player
+            self.make_move(x, y, player)
             return True
         else:
             return False
 
+    def make_move(self, x, y, player):
+        """
+        Plays a move without checking it, updating the counters of the
+        lines through the cell only and the Zobrist keys
+        :param x: X coordinate of an empty cell
+        :param y: Y coordinate of an empty cell
+        :param player: the current player
+        :return: True if the move wins
+        """
+        self.state[x][y] = player
+        self.filled += 1
+        self.hashes = list(map(xor, self.hashes, self.cell_keys[x][y][player]))
+        counts = self.counts[player]
+        k = self.k
+        won = False
+        for index in self.cell_lines[x][y]:
+            counts[index] += 1
+            if counts[index] == k:
+                self.completed[player] += 1
+                won = True
+        return won
+
+    def unmake_move(self, x, y):
+        """
+        Takes back a move played with make_move()
+        :param x: X coordinate
+        :param y: Y coordinate
+        """
+        player = self.state[x][y]
+        self.state[x][y] = 0
+        self.filled -= 1
+        self.hashes = list(map(xor, self.hashes, self.cell_keys[x][y][player]))
+        counts = self.counts[player]
+        k = self.k
+        for index in self.cell_lines[x][y]:
+            if counts[index] == k:
+                self.completed[player] -= 1
+            counts[index] -= 1
+
 
 class Console():
     def __init__(self):
@@ -356,6 +688,10 @@ class Console():
         print()
         return
 
+        # Only a console needs these, so they are not imported with the
+        # module.
+        import platform
+        from os import system
         os_name = platform.system().lower()
         if 'windows' in os_name:
             system('cls')
@@ -389,6 +725,14 @@ def main():
     """
     # game (object): Instance of the class Game.
     game = Game()
+    # The shipped table answers every position of the 3x3 game, so the
+    # computer only searches if it is missing. Imported here, since
+    # book.py imports this module.
+    from book import DEFAULT_PATH, OpeningBook
+    try:
+        game.set_book(OpeningBook(DEFAULT_PATH))
+    except FileNotFoundError:
+        pass
     # term (object): Instance of the class Console.
     term = Console()
     # Paul Lu.  Set the seed to get deterministic behaviour for each run.
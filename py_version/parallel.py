@@ -0,0 +1,181 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from math import inf as infinity
+from os import cpu_count
+from oominimax import Game
+from search import AlphaBetaEngine
+from transposition import SharedTranspositionTable
+"""
+Search engine that splits the root moves of a search across processes.
+
+The first root move is searched in this process to get a bound (the other
+moves only matter if they beat it); the remaining moves are handed to a
+ProcessPoolExecutor in row-major order, at most one per worker at a time,
+so each one starts with the best score known when it is sent. Small
+searches are not worth the process overhead and run serially. Given a
+SharedTranspositionTable, this process and every worker search with it,
+so a subtree one of them searched is reused by all.
+"""
+
+# worker_engine (AlphaBetaEngine): Engine of this worker process, kept
+# between tasks so its transposition table keeps helping.
+worker_engine = None
+
+
+def search_child(shape, state, depth, player, alpha, table=None):
+    """
+    Scores one root move in a worker process
+    :param shape: (rows, cols, k) of the game
+    :param state: board after the root move
+    :param depth: remaining depth to search
+    :param player: the player to move after the root move
+    :param alpha: score the root player is already guaranteed
+    :param table: name of a SharedTranspositionTable to search with, or
+    None for one of the worker's own
+    :return: (score for the root player, nodes visited)
+    """
+    global worker_engine
+    if worker_engine is None:
+        worker_engine = AlphaBetaEngine(
+            None if table is None else SharedTranspositionTable(name=table))
+    game = Game(*shape)
+    game.set_state(state)
+    worker_engine.nodes = 0
+    score = -worker_engine.negamax(game, depth, player,
+                                   -infinity, -alpha, 1)
+    return score, worker_engine.nodes
+
+
+class ParallelEngine():
+    def __init__(self, workers=None, serial_below=100000, table=None):
+        """Constructs necessary attributes for the ParallelEngine class.
+
+        Arguments:
+        self: Represents instance of ParallelEngine().
+        workers (int): Number of worker processes, one per CPU if None.
+        serial_below (int): Searches with fewer leaf paths than this (the
+        product of the move counts over the depth) run serially.
+        table (SharedTranspositionTable): Table shared with the workers,
+        or None for a table per process.
+
+        Return: None
+        """
+        # self.workers (int): Number of worker processes.
+        self.workers = workers
+        # self.serial_below (int): Size under which searches are serial.
+        self.serial_below = serial_below
+        # self.table (SharedTranspositionTable): Table shared with the
+        # workers, or None.
+        self.table = table
+        # self.table_name (str): Name the workers attach to it by.
+        self.table_name = None if table is None else table.name
+        # self.serial (AlphaBetaEngine): Engine for serial searches and
+        # the first root move.
+        self.serial = AlphaBetaEngine(table)
+        # self.pool (ProcessPoolExecutor): Workers, started on first use.
+        self.pool = None
+        # self.nodes (int): Number of nodes visited by the last search.
+        self.nodes = 0
+
+    def __str__(self):
+        """Informal string representation of ParallelEngine().
+
+        Arguments: self: Represents instance of ParallelEngine().
+
+        Return: Informal string representing ParallelEngine().
+        """
+        return 'A root-splitting engine with {} workers'.format(
+                self.workers or 'one per CPU')
+
+    def __enter__(self):
+        """Using the engine in a with statement closes its workers after.
+
+        Arguments: self: Represents instance of ParallelEngine().
+
+        Return: self
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the workers at the end of a with statement.
+
+        Arguments: self: Represents instance of ParallelEngine().
+
+        Return: None
+        """
+        self.close()
+
+    def close(self):
+        """Shuts the worker processes down.
+
+        Arguments: self: Represents instance of ParallelEngine().
+
+        Return: None
+        """
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def search(self, game, depth, player):
+        """Finds the same move as Game.minimax(), searching the root moves
+        in parallel when the search is big enough.
+
+        Arguments:
+        self: Represents instance of ParallelEngine().
+        game (Game): Game to search, restored on return.
+        depth (int): Remaining depth to search.
+        player (int): The player to move.
+
+        Return: (list) [the best row, best col, best score]
+        """
+        cells = game.empty_cells()
+        size = 1
+        for ply in range(min(depth, len(cells))):
+            size *= len(cells) - ply
+        if size < self.serial_below or len(cells) < 2 or game.game_over():
+            best = self.serial.search(game, depth, player)
+            self.nodes = self.serial.nodes
+            return best
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        workers = self.workers or cpu_count() or 1
+        shape = (game.rows, game.cols, game.k)
+        state = game.get_state()
+
+        # The first move gives the bound the others are searched against.
+        x, y = cells[0]
+        game.make_move(x, y, player)
+        self.serial.nodes = 0
+        score = -self.serial.negamax(game, depth - 1, -player,
+                                     -infinity, infinity, 1)
+        game.unmake_move(x, y)
+        best, best_index = [x, y, score], 0
+        self.nodes = 1 + self.serial.nodes
+
+        # Moves go out in row-major order, so every move still running or
+        # finished has a lower index than the next one sent, and the next
+        # one only has to beat the best score strictly.
+        pending = {}
+        queue = list(enumerate(cells))[1:]
+        while queue or pending:
+            while queue and len(pending) < workers:
+                index, (x, y) = queue.pop(0)
+                game.make_move(x, y, player)
+                child = [row[:] for row in state]
+                game.unmake_move(x, y)
+                future = self.pool.submit(
+                    search_child, shape, child, depth - 1, -player,
+                    best[2], self.table_name)
+                pending[future] = (index, x, y)
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, x, y = pending.pop(future)
+                score, nodes = future.result()
+                self.nodes += nodes
+                if score > best[2] or (score == best[2]
+                                       and index < best_index):
+                    best, best_index = [x, y, score], index
+
+        # Back to the computer's point of view, as AlphaBetaEngine.search().
+        best[2] *= player
+        return best
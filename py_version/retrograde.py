@@ -0,0 +1,168 @@
+import argparse
+from array import array
+from book import default_path, record_layout, write_book
+from oominimax import win_lines
+"""
+Bottom-up (retrograde) solver for tic-tac-toe on any board that fits in
+memory.
+
+Instead of searching down from each position like Game.minimax(), solve()
+lists every reachable position ply by ply, then scores them from the last
+ply back to the empty board: finished positions get their result from the
+lines, and every other position the best of its children, which are one
+ply deeper and already scored. Each position is scored once, so the whole
+game is solved in one pass over the positions.
+
+Positions are seen by the player to move, as a pair of bitmasks (own
+cells, opponent's cells, bit x * cols + y for cell [x, y]), and indexed
+like the records of book.py, so the result is written as the same table
+OpeningBook() and Game.set_book() read. The best move is the first cell
+in row-major order with the best score, the one minimax() picks.
+
+Usage: python3 retrograde.py [book.bin] [--size 3 4 3]
+"""
+
+
+def mask_codes(cells):
+    """
+    Base-3 value of every mask of cells with a 1 digit on each set bit
+    :param cells: number of cells of the board
+    :return: an array where [mask] is the sum of 3 ** cell over its bits;
+    the book index of (own, opp) is codes[own] + 2 * codes[opp]
+    """
+    codes = array('Q', [0]) * (1 << cells)
+    for cell in range(cells):
+        bit, weight = 1 << cell, 3 ** cell
+        for mask in range(bit):
+            codes[mask | bit] = codes[mask] + weight
+    return codes
+
+
+def line_masks(rows, cols, k):
+    """
+    The winning lines of a board as masks
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: a tuple of masks
+    """
+    return tuple(sum(1 << (x * cols + y) for x, y in line)
+                 for line in win_lines(rows, cols, k))
+
+
+def wins(mask, lines):
+    """
+    Tests if a mask of cells holds a whole line
+    :param mask: one player's cells
+    :param lines: line_masks() of the board
+    :return: True if it does
+    """
+    for line in lines:
+        if mask & line == line:
+            return True
+    return False
+
+
+def levels(rows=3, cols=3, k=3):
+    """
+    Every reachable position, ply by ply
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: a list with, for each ply, an array of the positions packed
+    as own | opp << cells, seen by the player to move
+    """
+    cells = rows * cols
+    full = (1 << cells) - 1
+    lines = line_masks(rows, cols, k)
+    codes = mask_codes(cells)
+    seen = bytearray(3 ** cells)
+    found = [array('Q', [0])]
+    while True:
+        following = array('Q')
+        for packed in found[-1]:
+            own, opp = packed & full, packed >> cells
+            if wins(opp, lines) or own | opp == full:
+                continue
+            empty = full & ~(own | opp)
+            while empty:
+                bit = empty & -empty
+                empty ^= bit
+                # The opponent moves next, so the child is seen from
+                # their side: their cells first.
+                index = codes[opp] + 2 * codes[own | bit]
+                if not seen[index]:
+                    seen[index] = 1
+                    following.append(opp | (own | bit) << cells)
+        if not following:
+            return found
+        found.append(following)
+
+
+def solve(rows=3, cols=3, k=3):
+    """
+    Scores every reachable position from the last ply back
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: (records, count) the records of a book.py table and the
+    number of positions with a move in it
+    """
+    cells = rows * cols
+    full = (1 << cells) - 1
+    lines = line_masks(rows, cols, k)
+    codes = mask_codes(cells)
+    size, bits = record_layout(cells)
+    records = bytearray(b'\xff') * (size * 3 ** cells)
+    # values (bytearray): Score plus one of every position, for the
+    # player to move.
+    values = bytearray(3 ** cells)
+    count = 0
+    for level in reversed(levels(rows, cols, k)):
+        for packed in level:
+            own, opp = packed & full, packed >> cells
+            index = codes[own] + 2 * codes[opp]
+            if wins(opp, lines):
+                values[index] = 0
+                continue
+            if own | opp == full:
+                values[index] = 1
+                continue
+            best, move = -2, 0
+            empty = full & ~(own | opp)
+            while empty:
+                bit = empty & -empty
+                empty ^= bit
+                score = 1 - values[codes[opp] + 2 * codes[own | bit]]
+                if score > best:
+                    best, move = score, bit.bit_length() - 1
+                    if best == 1:
+                        break
+            values[index] = best + 1
+            record = (best + 1) << bits | move
+            if size == 1:
+                records[index] = record
+            else:
+                records[index * size:(index + 1) * size] = \
+                    record.to_bytes(size, 'little')
+            count += 1
+    return records, count
+
+
+def main():
+    """
+    Solves a board from the command line and writes its table
+    """
+    parser = argparse.ArgumentParser(description='Retrograde solver.')
+    parser.add_argument('path', nargs='?', default=None)
+    parser.add_argument('--size', type=int, nargs=3, default=(3, 3, 3),
+                        metavar=('ROWS', 'COLS', 'K'))
+    args = parser.parse_args()
+    path = args.path or default_path(*args.size)
+    records, count = solve(*args.size)
+    write_book(path, records, *args.size)
+    print(f'Wrote {count} positions to {path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,536 @@
+from math import inf as infinity
+from math import nextafter
+from random import Random
+from time import perf_counter
+from mcts import MCTSEngine
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from symmetry import restore_move, transform_move
+from zobrist import NEGAMAX_KEY
+"""
+Search engines that pick a move for a Game() from oominimax.py.
+
+Every engine has a search(game, depth, player) method with the same
+arguments and return value as Game.minimax(), so Game.ai_turn() can use
+any of them.
+"""
+
+
+class MinimaxEngine():
+    def __init__(self):
+        """Constructs necessary attributes for the MinimaxEngine class.
+
+        Arguments: self: Represents instance of MinimaxEngine().
+
+        Return: None
+        """
+        # self.nodes (int): Number of nodes visited by the last search.
+        self.nodes = 0
+        # self.stats (SearchStats): Instrumentation, or None.
+        self.stats = None
+
+    def __str__(self):
+        """Informal string representation of MinimaxEngine().
+
+        Arguments: self: Represents instance of MinimaxEngine().
+
+        Return: Informal string representing MinimaxEngine().
+        """
+        return 'A full-width minimax engine'
+
+    def search(self, game, depth, player):
+        """Searches with the game's own Game.minimax(), which reports to
+        the engine's stats, or to the game's own if the engine has none.
+
+        Arguments:
+        self: Represents instance of MinimaxEngine().
+        game (Game): Game to search, restored on return.
+        depth (int): Remaining depth to search.
+        player (int): The player to move.
+
+        Return: (list) [the best row, best col, best score]
+        """
+        saved = game.stats
+        start = game.nodes
+        if self.stats is not None:
+            game.stats = self.stats
+        try:
+            best = game.minimax(depth, player)
+        finally:
+            game.stats = saved
+        self.nodes = game.nodes - start
+        return best
+
+
+class RandomEngine():
+    def __init__(self, seed=None):
+        """Constructs necessary attributes for the RandomEngine class.
+
+        Arguments:
+        self: Represents instance of RandomEngine().
+        seed (int): Seed of the engine's own random generator.
+
+        Return: None
+        """
+        # self.rng (Random): Generator the moves are drawn from.
+        self.rng = Random(seed)
+        # self.nodes (int): Number of nodes visited by the last search.
+        self.nodes = 0
+
+    def __str__(self):
+        """Informal string representation of RandomEngine().
+
+        Arguments: self: Represents instance of RandomEngine().
+
+        Return: Informal string representing RandomEngine().
+        """
+        return 'An engine playing random empty cells'
+
+    def seed(self, seed):
+        """Reseeds the engine's random generator.
+
+        Arguments:
+        self: Represents instance of RandomEngine().
+        seed (int): The new seed.
+
+        Return: None
+        """
+        self.rng.seed(seed)
+
+    def search(self, game, depth, player):
+        """Picks a random empty cell without searching.
+
+        Arguments:
+        self: Represents instance of RandomEngine().
+        game (Game): Game to move in.
+        depth (int): Unused.
+        player (int): The player to move.
+
+        Return: (list) [row, col, score of the current position]
+        """
+        self.nodes = 1
+        cells = game.empty_cells()
+        if not cells or game.game_over():
+            return [-1, -1, game.evaluate()]
+        x, y = self.rng.choice(cells)
+        return [x, y, game.evaluate()]
+
+
+class AlphaBetaEngine():
+    def __init__(self, table=None):
+        """Constructs necessary attributes for the AlphaBetaEngine class.
+
+        Arguments:
+        self: Represents instance of AlphaBetaEngine().
+        table (TranspositionTable): Table to use, a new one if None.
+
+        Return: None
+        """
+        # self.table (TranspositionTable): Scores from the mover's view.
+        self.table = table if table is not None else TranspositionTable()
+        # self.nodes (int): Number of nodes visited by the last search.
+        self.nodes = 0
+        # self.killers (list): Up to two quiet cutoff moves per ply.
+        self.killers = []
+        # self.history (dict): (player, x, y) -> cutoff score.
+        self.history = {}
+        # self.stats (SearchStats): Instrumentation, or None.
+        self.stats = None
+
+    def __str__(self):
+        """Informal string representation of AlphaBetaEngine().
+
+        Arguments: self: Represents instance of AlphaBetaEngine().
+
+        Return: Informal string representing AlphaBetaEngine().
+        """
+        return 'A negamax alpha-beta engine that visited {} nodes'.format(
+                self.nodes)
+
+    def search(self, game, depth, player):
+        """Finds the same move as Game.minimax() with alpha-beta cutoffs.
+
+        The root moves are tried in row-major order like Game.minimax()
+        so that ties are broken the same way; a later move only replaces
+        the best one when it scores strictly higher.
+
+        Arguments:
+        self: Represents instance of AlphaBetaEngine().
+        game (Game): Game to search, restored on return.
+        depth (int): Remaining depth to search.
+        player (int): The player to move.
+
+        Return: (list) [the best row, best col, best score]
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.begin_move(depth)
+            stats.node(depth)
+        self.nodes = 1
+        if depth == 0 or game.game_over():
+            if stats is not None:
+                stats.terminal()
+                stats.end_move()
+            return [-1, -1, game.evaluate()]
+
+        best = [-1, -1, -infinity]
+        for x, y in game.empty_cells():
+            game.make_move(x, y, player)
+            score = -self.negamax(game, depth - 1, -player,
+                                  -infinity, -best[2], 1)
+            game.unmake_move(x, y)
+            if stats is not None:
+                stats.edge(depth, x, y, score)
+            if score > best[2]:
+                best = [x, y, score]
+
+        # Scores are from the mover's point of view, minimax's are not.
+        best[2] *= player
+        if stats is not None:
+            stats.end_move()
+        return best
+
+    def negamax(self, game, depth, player, alpha, beta, ply):
+        """Scores a position for the player to move.
+
+        Arguments:
+        self: Represents instance of AlphaBetaEngine().
+        game (Game): Game to search, restored on return.
+        depth (int): Remaining depth to search.
+        player (int): The player to move.
+        alpha (number): Score the mover is already guaranteed.
+        beta (number): Score the opponent is already guaranteed.
+        ply (int): Distance from the root.
+
+        Return: best (number): Score of the position for player.
+        """
+        self.nodes += 1
+        stats = self.stats
+        if stats is not None:
+            stats.node(depth)
+        if depth == 0 or game.game_over():
+            if stats is not None:
+                stats.terminal()
+            return player * game.evaluate()
+
+        # Positions are stored under their symmetry representative, with
+        # the best move on the representative, apart from the entries of
+        # Game.minimax() in case the table is shared with it.
+        key, sym = game.table_key(player)
+        key ^= NEGAMAX_KEY
+        score, tt_move = self.table.lookup(key, depth, alpha, beta)
+        if score is not None:
+            if stats is not None:
+                stats.hit()
+            return score
+        if tt_move is not None:
+            tt_move = tuple(restore_move(tt_move[0], tt_move[1], sym,
+                                         game.rows, game.cols))
+
+        alpha_orig = alpha
+        best = -infinity
+        best_move = None
+        for move in self.order_moves(game, tt_move, ply, player):
+            x, y = move
+            game.make_move(x, y, player)
+            score = -self.negamax(game, depth - 1, -player,
+                                  -beta, -alpha, ply + 1)
+            game.unmake_move(x, y)
+            if stats is not None:
+                stats.edge(depth, x, y, score)
+
+            if score > best:
+                best, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if stats is not None:
+                            stats.cutoff()
+                        self.record_cutoff(move, depth, ply, player)
+                        break
+
+        if best_move is None:
+            # A full board with depth left has no move to store.
+            return best
+        if best <= alpha_orig:
+            flag = UPPER
+        elif best >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        best_move = transform_move(best_move[0], best_move[1], sym,
+                                   game.rows, game.cols)
+        self.table.store(key, depth, flag, best, tuple(best_move))
+        return best
+
+    def order_moves(self, game, tt_move, ply, player):
+        """Orders moves so the ones most likely to cause a cutoff go first:
+        the table move, then the killer moves, then by history score and
+        by the number of lines through the cell (on 3x3: center, corners,
+        then edges).
+
+        Arguments:
+        self: Represents instance of AlphaBetaEngine().
+        game (Game): Game whose empty cells are ordered.
+        tt_move (tuple): Best move stored in the table, or None.
+        ply (int): Distance from the root.
+        player (int): The player to move.
+
+        Return: (list) moves as (x, y) tuples.
+        """
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+        cell_lines = game.cell_lines
+
+        def priority(move):
+            if move == tt_move:
+                return (2, 0, 0)
+            if move in killers:
+                return (1, 0, 0)
+            return (0, history.get((player,) + move, 0),
+                    len(cell_lines[move[0]][move[1]]))
+
+        return sorted([(x, y) for x, y in game.empty_cells()],
+                      key=priority, reverse=True)
+
+    def record_cutoff(self, move, depth, ply, player):
+        """Remembers a move that caused a cutoff for the killer and
+        history heuristics.
+
+        Arguments:
+        self: Represents instance of AlphaBetaEngine().
+        move (tuple): The move (x, y) that caused the cutoff.
+        depth (int): Remaining depth at the cutoff.
+        ply (int): Distance from the root.
+        player (int): The player who made the move.
+
+        Return: None
+        """
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        key = (player,) + move
+        self.history[key] = self.history.get(key, 0) + depth * depth
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search when its time budget runs out or it is
+    cancelled."""
+
+
+class IterativeDeepeningEngine(AlphaBetaEngine):
+    def __init__(self, budget_ms=100, table=None):
+        """Constructs necessary attributes for the IterativeDeepeningEngine
+        class.
+
+        Arguments:
+        self: Represents instance of IterativeDeepeningEngine().
+        budget_ms (number): Wall-clock time allowed per move, in
+        milliseconds, or None for no limit.
+        table (TranspositionTable): Table to use, a new one if None.
+
+        Return: None
+        """
+        AlphaBetaEngine.__init__(self, table)
+        # self.budget_ms (number): Time allowed per move, or None.
+        self.budget_ms = budget_ms
+        # self.deadline (float): perf_counter() time the search must stop.
+        self.deadline = infinity
+        # self.generation (int): Number of the running or last search.
+        self.generation = 0
+        # self.cancelled (int): Generation of the search cancel() last
+        # stopped, so a late cancel() never stops the next search.
+        self.cancelled = 0
+        # self.completed_depth (int): Deepest iteration the last search
+        # finished.
+        self.completed_depth = 0
+
+    def __str__(self):
+        """Informal string representation of IterativeDeepeningEngine().
+
+        Arguments: self: Represents instance of IterativeDeepeningEngine().
+
+        Return: Informal string representing IterativeDeepeningEngine().
+        """
+        return """An iterative deepening engine with a {} ms budget that
+         finished depth {} in {} nodes""".format(
+                self.budget_ms, self.completed_depth, self.nodes)
+
+    def cancel(self):
+        """Stops the running search as soon as possible, for example from
+        another thread; search() then returns the best move found so far,
+        once the first iteration is done. A cancel() that comes after a
+        search has returned (a watchdog firing late) stops nothing.
+
+        Arguments: self: Represents instance of IterativeDeepeningEngine().
+
+        Return: None
+        """
+        self.cancelled = self.generation
+
+    def search(self, game, depth, player):
+        """Searches 1, 2, ... plies deep until depth is reached or the time
+        budget runs out, and returns the best move of the deepest finished
+        iteration. Each iteration tries the previous best move first and
+        breaks ties in row-major order, so a search that reaches depth
+        finds the same move as Game.minimax().
+
+        Arguments:
+        self: Represents instance of IterativeDeepeningEngine().
+        game (Game): Game to search, restored on return.
+        depth (int): Most plies to search.
+        player (int): The player to move.
+
+        Return: (list) [the best row, best col, best score]
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.begin_move(depth)
+        self.generation += 1
+        try:
+            return self.deepen(game, depth, player)
+        finally:
+            if stats is not None:
+                stats.end_move()
+
+    def deepen(self, game, depth, player):
+        """The iterations of search(). The first one always finishes, so
+        the move returned is never worse than a one-ply search's.
+
+        Arguments:
+        self: Represents instance of IterativeDeepeningEngine().
+        game (Game): Game to search, restored on return.
+        depth (int): Most plies to search.
+        player (int): The player to move.
+
+        Return: (list) [the best row, best col, best score]
+        """
+        stats = self.stats
+        start = perf_counter()
+        self.nodes = 1
+        self.completed_depth = 0
+        if self.budget_ms is None:
+            self.deadline = infinity
+        else:
+            self.deadline = start + self.budget_ms / 1000
+        if depth == 0 or game.game_over():
+            return [-1, -1, game.evaluate()]
+
+        state = game.get_state()
+        saved = [row[:] for row in state]
+        cells = [(x, y) for x, y in game.empty_cells()]
+        best = [cells[0][0], cells[0][1], -infinity]
+        for iteration in range(1, depth + 1):
+            if iteration > 1 and self.cancelled == self.generation:
+                break
+            if stats is not None:
+                # Plies in the trace count from this iteration's root.
+                stats.root_depth = iteration
+            try:
+                best = self.search_root(game, iteration, player, cells, best)
+            except SearchTimeout:
+                # Put back the cells the unwound search left played.
+                for row, saved_row in zip(state, saved):
+                    row[:] = saved_row
+                game.recount()
+                break
+            self.completed_depth = iteration
+        return [best[0], best[1], player * best[2]]
+
+    def search_root(self, game, depth, player, cells, previous):
+        """Searches every root move to a fixed depth, previous best first.
+
+        Arguments:
+        self: Represents instance of IterativeDeepeningEngine().
+        game (Game): Game to search.
+        depth (int): Plies to search.
+        player (int): The player to move.
+        cells (list): Empty cells as (x, y), in row-major order.
+        previous (list): [row, col, score] of the last iteration.
+
+        Return: (list) [the best row, best col, best score for player]
+        """
+        first = (previous[0], previous[1])
+        order = [first] + [cell for cell in cells if cell != first]
+        best, best_index = None, None
+        for x, y in order:
+            index = cells.index((x, y))
+            if best is None:
+                alpha = -infinity
+            elif index < best_index:
+                # An earlier cell wins a tie, so ask if it reaches best.
+                alpha = nextafter(best[2], -infinity)
+            else:
+                alpha = best[2]
+            game.make_move(x, y, player)
+            score = -self.negamax(game, depth - 1, -player,
+                                  -infinity, -alpha, 1)
+            game.unmake_move(x, y)
+            if self.stats is not None:
+                self.stats.edge(depth, x, y, score)
+            if best is None or score > alpha:
+                if best is None or score > best[2] or index < best_index:
+                    best, best_index = [x, y, score], index
+        return best
+
+    def negamax(self, game, depth, player, alpha, beta, ply):
+        """AlphaBetaEngine.negamax() that gives up with SearchTimeout once
+        the deadline passes or the search is cancelled, after the first
+        iteration.
+
+        Arguments:
+        self: Represents instance of IterativeDeepeningEngine().
+        game (Game): Game to search.
+        depth (int): Remaining depth to search.
+        player (int): The player to move.
+        alpha (number): Score the mover is already guaranteed.
+        beta (number): Score the opponent is already guaranteed.
+        ply (int): Distance from the root.
+
+        Return: best (number): Score of the position for player.
+        """
+        if self.nodes & 63 == 0 and self.completed_depth \
+                and (self.cancelled == self.generation
+                     or perf_counter() > self.deadline):
+            raise SearchTimeout()
+        return AlphaBetaEngine.negamax(self, game, depth, player,
+                                       alpha, beta, ply)
+
+
+def parallel_engine(**kwargs):
+    """
+    Builds a ParallelEngine, imported here since parallel.py imports this
+    module
+    :param kwargs: arguments passed to ParallelEngine
+    :return: the new engine
+    """
+    from parallel import ParallelEngine
+    return ParallelEngine(**kwargs)
+
+
+# ENGINES (dict): Engine classes, or functions building them, by the name
+# used to pick them.
+ENGINES = {
+    'random': RandomEngine,
+    'minimax': MinimaxEngine,
+    'alphabeta': AlphaBetaEngine,
+    'iterative': IterativeDeepeningEngine,
+    'mcts': MCTSEngine,
+    'parallel': parallel_engine,
+}
+
+
+def make_engine(name, **kwargs):
+    """
+    Builds a search engine from its name
+    :param name: a key of ENGINES
+    :param kwargs: arguments passed to the engine class
+    :return: the new engine
+    """
+    try:
+        engine_class = ENGINES[name]
+    except KeyError:
+        raise ValueError(f'unknown engine {name!r}') from None
+    return engine_class(**kwargs)
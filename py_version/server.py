@@ -0,0 +1,558 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import secrets
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import monotonic
+from book import OpeningBook, default_path
+from oominimax import Game
+from session import GameSession, HUMAN, COMP
+from transposition import SharedTranspositionTable
+"""
+A local asyncio server hosting many games against the Python engine at
+once, over plain HTTP with JSON bodies or over a WebSocket.
+
+HTTP (keep-alive connections are reused):
+    POST   /games              {"first": -1 or 1} starts a game
+    GET    /games/<id>         state of a game
+    POST   /games/<id>/moves   {"x": row, "y": col} plays the human's
+                               move and answers with the computer's
+    DELETE /games/<id>         ends a game
+    GET    /stats              number of sessions and connections
+WebSocket (GET /ws): text messages {"op": "new", "first": -1 or 1},
+{"op": "move", "x": row, "y": col} and {"op": "get"} for one game at a
+time per connection, each answered with the game's state.
+
+Every game is a GameSession kept in memory and dropped after max_idle
+seconds without a request. The computer's moves are searched in a
+process pool, never on the event loop, so a slow search only delays its
+own game. The workers map the table book.py writes for the board (or
+the one given with --book), if there is one, and answer the positions it
+holds without searching; with --table-size they share one
+SharedTranspositionTable instead of warming their own.
+Only what these clients need of HTTP/1.1 and RFC 6455 is implemented: no
+chunked bodies and no fragmented WebSocket messages.
+
+Usage: python3 server.py [--port 8080] [--workers 4]
+"""
+
+# Appended to a client's key in the WebSocket handshake (RFC 6455).
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+# Opcodes of the WebSocket frames.
+TEXT, CLOSE, PING, PONG = 0x1, 0x8, 0x9, 0xA
+# Largest request body or WebSocket message accepted, in bytes.
+MAX_BODY = 1 << 16
+REASONS = {200: 'OK', 201: 'Created', 204: 'No Content',
+           400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict'}
+
+# worker_games (dict): (rows, cols, k) -> Game of this worker process,
+# kept like parallel.worker_engine.
+worker_games = {}
+
+
+def search_move(shape, state, player, book=None, table=None):
+    """
+    Chooses a move in a worker process
+    :param shape: (rows, cols, k) of the game
+    :param state: the state of the current board
+    :param player: the player to move
+    :param book: path of an OpeningBook to look moves up in, or None
+    :param table: name of a SharedTranspositionTable to search with, or
+    None for one of the worker's own
+    :return: a list [x, y]
+    """
+    game = worker_games.get(shape)
+    if game is None:
+        game = worker_games[shape] = Game(*shape)
+        if book is not None:
+            game.set_book(OpeningBook(book))
+        if table is not None:
+            game.set_table(SharedTranspositionTable(name=table))
+    game.set_state([row[:] for row in state])
+    return game.choose_move(player)
+
+
+def mask_payload(payload, mask):
+    """
+    XORs a WebSocket payload with its 4-byte mask, which also unmasks it
+    :param payload: the bytes
+    :param mask: the 4 mask bytes
+    :return: the masked bytes
+    """
+    size = len(payload)
+    key = (mask * (size // 4 + 1))[:size]
+    return (int.from_bytes(payload, 'big')
+            ^ int.from_bytes(key, 'big')).to_bytes(size, 'big')
+
+
+def encode_frame(opcode, payload, mask=False):
+    """
+    Builds an unfragmented WebSocket frame
+    :param opcode: TEXT, CLOSE, PING or PONG
+    :param payload: the bytes to send
+    :param mask: True to mask the payload, as clients must
+    :return: the frame as bytes
+    """
+    size = len(payload)
+    bit = 0x80 if mask else 0
+    if size < 126:
+        head = struct.pack('!BB', 0x80 | opcode, bit | size)
+    elif size < 1 << 16:
+        head = struct.pack('!BBH', 0x80 | opcode, bit | 126, size)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, bit | 127, size)
+    if mask:
+        key = secrets.token_bytes(4)
+        return head + key + mask_payload(payload, key)
+    return head + payload
+
+
+async def read_frame(reader):
+    """
+    Reads one WebSocket frame
+    :param reader: the connection's StreamReader
+    :return: (opcode, payload) with the payload unmasked
+    """
+    first, second = await reader.readexactly(2)
+    size = second & 0x7F
+    if size == 126:
+        size = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif size == 127:
+        size = struct.unpack('!Q', await reader.readexactly(8))[0]
+    if size > MAX_BODY or not first & 0x80:
+        raise ValueError('message too large or fragmented')
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(size)
+    if mask is not None:
+        payload = mask_payload(payload, mask)
+    return first & 0x0F, payload
+
+
+def accept_key(key):
+    """
+    The Sec-WebSocket-Accept answer to a client's Sec-WebSocket-Key
+    :param key: the client's key
+    :return: the answer as a str
+    """
+    digest = hashlib.sha1(key.encode() + WS_GUID).digest()
+    return base64.b64encode(digest).decode()
+
+
+def handshake_error(method, headers):
+    """
+    Checks a WebSocket upgrade request
+    :param method: the request's method
+    :param headers: the request's headers, names in lower case
+    :return: what is wrong with it as a str, or None if it is valid
+    """
+    if method != 'GET':
+        return 'a WebSocket upgrade must be a GET'
+    if headers.get('sec-websocket-version') != '13':
+        return 'Sec-WebSocket-Version must be 13'
+    try:
+        key = base64.b64decode(headers['sec-websocket-key'], validate=True)
+    except (KeyError, ValueError):
+        key = None
+    if key is None or len(key) != 16:
+        return 'Sec-WebSocket-Key must be 16 bytes in base64'
+    return None
+
+
+def response(status, result, close):
+    """
+    Encodes an HTTP response with a JSON body
+    :param status: the status code, a key of REASONS
+    :param result: the body as JSON-able data, or None for none
+    :param close: True to tell the client the connection closes
+    :return: the whole response as bytes
+    """
+    payload = b'' if result is None else json.dumps(result).encode()
+    return (f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+            'Content-Type: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+            f'Connection: {"close" if close else "keep-alive"}\r\n'
+            '\r\n').encode() + payload
+
+
+async def read_request(reader):
+    """
+    Reads the head of an HTTP request
+    :param reader: the connection's StreamReader
+    :return: (method, path, version, headers) with header names in lower
+    case, or None once the client closed the connection
+    """
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode('latin-1').split('\r\n')
+    method, path, version = lines[0].split(' ', 2)
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+    return method, path, version, headers
+
+
+class GameServer():
+    def __init__(self, shape=(3, 3, 3), workers=None, max_idle=300,
+                 book=None, table_size=None):
+        """Constructs necessary attributes for the GameServer class.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        shape (tuple): (rows, cols, k) of the games.
+        workers (int): Number of search processes, one per CPU if None;
+        0 searches in one thread of this process instead.
+        max_idle (number): Seconds a game is kept without a request.
+        book (str): Path of an OpeningBook the searches look moves up in,
+        or None.
+        table_size (int): Entries of a SharedTranspositionTable made for
+        the searches, or None for a table per worker.
+
+        Return: None
+        """
+        # self.shape (tuple): (rows, cols, k) of the games.
+        self.shape = tuple(shape)
+        # self.max_idle (number): Seconds a game is kept without a request.
+        self.max_idle = max_idle
+        # self.book (str): Path of the workers' OpeningBook, or None.
+        self.book = book
+        # self.table (SharedTranspositionTable): Table of the workers'
+        # searches, or None.
+        self.table = None
+        # self.table_name (str): Name the workers attach to the table by.
+        self.table_name = None
+        if table_size is not None:
+            self.table = SharedTranspositionTable(table_size)
+            self.table_name = self.table.name
+        # self.executor (Executor): Where the computer's moves are searched.
+        if workers == 0:
+            self.executor = ThreadPoolExecutor(1)
+        else:
+            self.executor = ProcessPoolExecutor(workers)
+        # self.sessions (dict): Game id -> GameSession.
+        self.sessions = {}
+        # self.locks (dict): Game id -> asyncio.Lock, so the moves of one
+        # game are handled one at a time.
+        self.locks = {}
+        # self.used (dict): Game id -> monotonic() of its last request.
+        self.used = {}
+        # self.connections (int): Number of open connections.
+        self.connections = 0
+
+    def __str__(self):
+        """Informal string representation of GameServer().
+
+        Arguments: self: Represents instance of GameServer().
+
+        Return: Informal string representing GameServer().
+        """
+        return 'A game server with {} games on {} open connections'.format(
+                len(self.sessions), self.connections)
+
+    def close(self):
+        """Shuts the search workers down and removes the shared table.
+
+        Arguments: self: Represents instance of GameServer().
+
+        Return: None
+        """
+        # The workers exit first, so none maps the table once it is gone.
+        self.executor.shutdown()
+        if self.table is not None:
+            self.table.close()
+            self.table.unlink()
+
+    async def serve(self, host='127.0.0.1', port=8080, ready=None):
+        """Accepts connections until cancelled.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        host (str): Address to listen on.
+        port (int): Port to listen on, 0 for any free port.
+        ready (asyncio.Future): Set to the bound port once listening.
+
+        Return: None
+        """
+        server = await asyncio.start_server(self.handle, host, port,
+                                            backlog=4096)
+        sweeper = asyncio.ensure_future(self.sweep())
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+    async def sweep(self):
+        """Drops the games left idle longer than max_idle, forever.
+
+        Arguments: self: Represents instance of GameServer().
+
+        Return: None
+        """
+        while True:
+            await asyncio.sleep(self.max_idle / 2)
+            limit = monotonic() - self.max_idle
+            for game_id in [game_id for game_id, used in self.used.items()
+                            if used < limit]:
+                self.drop(game_id)
+
+    def new_game(self, first):
+        """Starts a game.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        first (int): The player who moves first, HUMAN or COMP.
+
+        Return: game_id (str): Id of the new game.
+        """
+        session = GameSession(first, Game(*self.shape))
+        game_id = secrets.token_hex(8)
+        self.sessions[game_id] = session
+        self.locks[game_id] = asyncio.Lock()
+        self.used[game_id] = monotonic()
+        return game_id
+
+    def drop(self, game_id):
+        """Forgets a game.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        game_id (str): Id of the game.
+
+        Return: None
+        """
+        self.sessions.pop(game_id, None)
+        self.locks.pop(game_id, None)
+        self.used.pop(game_id, None)
+
+    def describe(self, game_id):
+        """State of a game, as sent to clients.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        game_id (str): Id of the game.
+
+        Return: (dict) GameSession.state() plus the 'id' and the last
+        'move' as [player, x, y], or None before the first move.
+        """
+        session = self.sessions[game_id]
+        result = session.state()
+        result['id'] = game_id
+        result['move'] = list(session.moves[-1]) if session.moves else None
+        return result
+
+    async def play(self, game_id, x=None, y=None):
+        """Plays the human's move, if given, then the computer's reply.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        game_id (str): Id of the game.
+        x (int): X coordinate of the human's move, or None.
+        y (int): Y coordinate of the human's move, or None.
+
+        Return: (dict) describe() after the moves.
+        """
+        session = self.sessions[game_id]
+        async with self.locks[game_id]:
+            self.used[game_id] = monotonic()
+            if x is not None:
+                session.move(HUMAN, x, y)
+            if session.to_move == COMP:
+                state = [row[:] for row in session.game.get_state()]
+                loop = asyncio.get_running_loop()
+                move = await loop.run_in_executor(
+                    self.executor, search_move, self.shape, state, COMP,
+                    self.book, self.table_name)
+                session.move(COMP, move[0], move[1])
+        return self.describe(game_id)
+
+    async def request(self, method, path, body):
+        """Answers one HTTP request.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        method (str): HTTP method.
+        path (str): Request path.
+        body (dict): JSON body, empty if none.
+
+        Return: (status, result) the HTTP status and a dict to send back,
+        or None for no body.
+        """
+        parts = path.split('?')[0].strip('/').split('/')
+        if parts == ['stats'] and method == 'GET':
+            return 200, {'sessions': len(self.sessions),
+                         'connections': self.connections}
+        if parts[0] != 'games' or len(parts) > 3:
+            return 404, {'error': f'no such path {path}'}
+        if len(parts) == 1:
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            game_id = self.new_game(int(body.get('first', HUMAN)))
+            return 201, await self.play(game_id)
+
+        game_id = parts[1]
+        if game_id not in self.sessions:
+            return 404, {'error': f'no game {game_id}'}
+        if len(parts) == 3:
+            if parts[2] != 'moves' or method != 'POST':
+                return 405, {'error': 'use POST /games/<id>/moves'}
+            return 200, await self.play(game_id, int(body['x']),
+                                        int(body['y']))
+        if method == 'GET':
+            return 200, self.describe(game_id)
+        if method == 'DELETE':
+            self.drop(game_id)
+            return 204, None
+        return 405, {'error': 'use GET or DELETE'}
+
+    async def handle(self, reader, writer):
+        """Serves one connection, HTTP requests until the client closes it
+        or a WebSocket once it asks for an upgrade.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        reader (StreamReader): Incoming side of the connection.
+        writer (StreamWriter): Outgoing side of the connection.
+
+        Return: None
+        """
+        self.connections += 1
+        try:
+            while True:
+                head = await read_request(reader)
+                if head is None:
+                    break
+                method, path, version, headers = head
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    error = handshake_error(method, headers)
+                    if error is None:
+                        await self.websocket(reader, writer, headers)
+                    else:
+                        writer.write(response(400, {'error': error}, True))
+                        await writer.drain()
+                    break
+                size = int(headers.get('content-length', 0))
+                if size > MAX_BODY:
+                    break
+                raw = await reader.readexactly(size)
+                try:
+                    body = json.loads(raw) if raw else {}
+                    if not isinstance(body, dict):
+                        raise ValueError('the body must be a JSON object')
+                except ValueError as error:
+                    status, result = 400, {'error': str(error)}
+                else:
+                    try:
+                        status, result = await self.request(method, path,
+                                                            body)
+                    except (KeyError, TypeError, ValueError) as error:
+                        # Unknown ids are answered before this, so here
+                        # the body was malformed or the move was not
+                        # allowed.
+                        status = 409 if path.endswith('moves') else 400
+                        result = {'error': str(error)}
+                close = headers.get('connection', '').lower() == 'close' \
+                    or version == 'HTTP/1.0'
+                writer.write(response(status, result, close))
+                await writer.drain()
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def websocket(self, reader, writer, headers):
+        """Serves a connection upgraded to a WebSocket.
+
+        Arguments:
+        self: Represents instance of GameServer().
+        reader (StreamReader): Incoming side of the connection.
+        writer (StreamWriter): Outgoing side of the connection.
+        headers (dict): Headers of the upgrade request.
+
+        Return: None
+        """
+        writer.write(
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+            'Sec-WebSocket-Accept: '
+            f'{accept_key(headers["sec-websocket-key"])}\r\n\r\n'.encode())
+        game_id = None
+        try:
+            while True:
+                opcode, payload = await read_frame(reader)
+                if opcode == CLOSE:
+                    writer.write(encode_frame(CLOSE, payload[:2]))
+                    break
+                if opcode == PING:
+                    writer.write(encode_frame(PONG, payload))
+                    continue
+                if opcode != TEXT:
+                    continue
+                try:
+                    message = json.loads(payload)
+                    op = message['op']
+                    if op == 'new':
+                        if game_id is not None:
+                            self.drop(game_id)
+                        game_id = self.new_game(
+                            int(message.get('first', HUMAN)))
+                        result = await self.play(game_id)
+                    elif game_id not in self.sessions:
+                        result = {'error': 'no game, send op "new" first'}
+                    elif op == 'move':
+                        result = await self.play(game_id, int(message['x']),
+                                                 int(message['y']))
+                    else:
+                        result = self.describe(game_id)
+                except (KeyError, TypeError, ValueError) as error:
+                    result = {'error': str(error)}
+                writer.write(encode_frame(TEXT, json.dumps(result).encode()))
+                await writer.drain()
+        finally:
+            if game_id is not None:
+                self.drop(game_id)
+
+
+def main():
+    """
+    Runs the server from the command line until interrupted
+    """
+    parser = argparse.ArgumentParser(description='Tic-tac-toe game server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--size', type=int, nargs=3, default=(3, 3, 3),
+                        metavar=('ROWS', 'COLS', 'K'))
+    parser.add_argument('--max-idle', type=float, default=300)
+    parser.add_argument('--book', default=None)
+    parser.add_argument('--table-size', type=int, default=None)
+    args = parser.parse_args()
+    if args.book is None and os.path.exists(default_path(*args.size)):
+        args.book = default_path(*args.size)
+    server = GameServer(tuple(args.size), args.workers, args.max_idle,
+                        args.book, args.table_size)
+    print(f'Serving on http://{args.host}:{args.port}')
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+from oominimax import Game, Console
+"""
+Headless game sessions: moves go in, the state of the game comes out, and
+nothing is printed or read from the keyboard. Rendering is left to
+observers, for example a ConsoleObserver, that a session calls after
+every move.
+"""
+
+HUMAN = -1
+COMP = +1
+
+
+class GameSession():
+    def __init__(self, first=HUMAN, game=None, observers=()):
+        """Constructs necessary attributes for the GameSession class.
+
+        Arguments:
+        self: Represents instance of GameSession().
+        first (int): The player who moves first, HUMAN or COMP.
+        game (Game): Game to play on, a new 3x3 Game() if None.
+        observers (iterable): Objects with an update(session, player, x, y)
+        method, called after every move.
+
+        Return: None
+        """
+        if first not in (HUMAN, COMP):
+            raise ValueError(f'first must be {HUMAN} or {COMP}')
+        # self.game (Game): The game being played.
+        self.game = game if game is not None else Game()
+        # self.to_move (int): The player whose turn it is, 0 once over.
+        self.to_move = first
+        # self.winner (int): The player who won, 0 if nobody (yet).
+        self.winner = 0
+        # self.moves (list): Moves played so far as (player, x, y).
+        self.moves = []
+        # self.observers (list): Objects told about every move.
+        self.observers = list(observers)
+        if self.game.game_over() or not self.game.empty_cells():
+            self.finish()
+
+    def __str__(self):
+        """Informal string representation of GameSession().
+
+        Arguments: self: Represents instance of GameSession().
+
+        Return: Informal string representing GameSession().
+        """
+        return 'A game session after {} moves with {} to move'.format(
+                len(self.moves), self.to_move)
+
+    def add_observer(self, observer):
+        """Adds an object to tell about every move.
+
+        Arguments:
+        self: Represents instance of GameSession().
+        observer (object): Object with an update(session, player, x, y)
+        method.
+
+        Return: None
+        """
+        self.observers.append(observer)
+
+    def over(self):
+        """Tests if the game has ended.
+
+        Arguments: self: Represents instance of GameSession().
+
+        Return: (bool) True once somebody won or the board is full.
+        """
+        return self.to_move == 0
+
+    def state(self):
+        """Snapshot of the game.
+
+        Arguments: self: Represents instance of GameSession().
+
+        Return: (dict) 'board' (a copy of the nested list state),
+        'to_move' (HUMAN, COMP or 0 once over), 'over' (bool) and
+        'winner' (HUMAN, COMP or 0).
+        """
+        return {
+            'board': [row[:] for row in self.game.get_state()],
+            'to_move': self.to_move,
+            'over': self.to_move == 0,
+            'winner': self.winner,
+        }
+
+    def play(self, x, y):
+        """Plays the human's move.
+
+        Arguments:
+        self: Represents instance of GameSession().
+        x (int): X coordinate.
+        y (int): Y coordinate.
+
+        Return: (dict) state() after the move.
+        """
+        self.move(HUMAN, x, y)
+        return self.state()
+
+    def ai_move(self):
+        """Lets the computer choose and play its move.
+
+        Arguments: self: Represents instance of GameSession().
+
+        Return: (dict) state() after the move.
+        """
+        if self.to_move != COMP:
+            raise ValueError('it is not the computer\'s turn')
+        x, y = self.game.choose_move(COMP)
+        self.move(COMP, x, y)
+        return self.state()
+
+    def move(self, player, x, y):
+        """Plays a move for either player and tells the observers.
+
+        Arguments:
+        self: Represents instance of GameSession().
+        player (int): HUMAN or COMP, must be the player to move.
+        x (int): X coordinate.
+        y (int): Y coordinate.
+
+        Return: None
+        """
+        if self.to_move == 0:
+            raise ValueError('the game is over')
+        if player != self.to_move:
+            raise ValueError(f'it is not player {player}\'s turn')
+        if not self.game.set_move(x, y, player):
+            raise ValueError(f'[{x}, {y}] is not an empty cell')
+
+        self.moves.append((player, x, y))
+        self.to_move = -player
+        if self.game.wins(player):
+            self.winner = player
+            self.finish()
+        elif not self.game.empty_cells():
+            self.finish()
+        for observer in self.observers:
+            observer.update(self, player, x, y)
+
+    def finish(self):
+        """Marks the game as over, recording a winner if there is one.
+
+        Arguments: self: Represents instance of GameSession().
+
+        Return: None
+        """
+        self.to_move = 0
+        if not self.winner:
+            if self.game.wins(COMP):
+                self.winner = COMP
+            elif self.game.wins(HUMAN):
+                self.winner = HUMAN
+
+
+class ConsoleObserver():
+    def __init__(self, c_choice='O', h_choice='X'):
+        """Constructs necessary attributes for the ConsoleObserver class.
+
+        Arguments:
+        self: Represents instance of ConsoleObserver().
+        c_choice (str): Computer's symbol, X or O.
+        h_choice (str): Human's symbol, X or O.
+
+        Return: None
+        """
+        # self.term (Console): Console the board is printed to.
+        self.term = Console()
+        # self.c_choice (str): Computer's symbol.
+        self.c_choice = c_choice
+        # self.h_choice (str): Human's symbol.
+        self.h_choice = h_choice
+
+    def __str__(self):
+        """Informal string representation of ConsoleObserver().
+
+        Arguments: self: Represents instance of ConsoleObserver().
+
+        Return: Informal string representing ConsoleObserver().
+        """
+        return 'An observer printing the board with {} for the computer'\
+            ' and {} for the human'.format(self.c_choice, self.h_choice)
+
+    def update(self, session, player, x, y):
+        """Prints the board after a move, and the result once over.
+
+        Arguments:
+        self: Represents instance of ConsoleObserver().
+        session (GameSession): The session that moved.
+        player (int): The player who moved.
+        x (int): X coordinate of the move.
+        y (int): Y coordinate of the move.
+
+        Return: None
+        """
+        symbol = self.c_choice if player == COMP else self.h_choice
+        self.term.clean()
+        print(f'[{symbol}] played [{x}, {y}]')
+        self.term.render(session.game.get_state(),
+                         self.c_choice, self.h_choice)
+        if session.over():
+            if session.winner == HUMAN:
+                print('YOU WIN!')
+            elif session.winner == COMP:
+                print('YOU LOSE!')
+            else:
+                print('DRAW!')
@@ -0,0 +1,169 @@
+from functools import lru_cache
+"""
+The symmetries of the tic-tac-toe board (rotations and reflections).
+
+A position and its rotations and reflections have the same score, so the
+searches and stored tables keep one representative per group: the
+transformed board with the smallest base-3 code. Moves found on the
+representative are mapped back to the board that was actually played
+with restore_move() or restore_mask(). Cells are numbered x * cols + y
+for the [x, y] coordinates Game.set_move() takes.
+
+Square boards have 8 symmetries; other rectangles only keep the 4 that
+do not swap rows and columns. Functions default to the 3x3 board.
+"""
+
+
+def board_maps(rows, cols):
+    """
+    Where each symmetry of a rows x cols board sends [x, y]
+    :param rows: number of rows
+    :param cols: number of cols
+    :return: a tuple of functions (x, y) -> (x, y), identity first
+    """
+    r, c = rows - 1, cols - 1
+    if rows != cols:
+        return (
+            lambda x, y: (x, y),          # identity
+            lambda x, y: (r - x, c - y),  # rotate 180
+            lambda x, y: (x, c - y),      # mirror left-right
+            lambda x, y: (r - x, y),      # mirror top-bottom
+        )
+    return (
+        lambda x, y: (x, y),          # identity
+        lambda x, y: (y, r - x),      # rotate 90
+        lambda x, y: (r - x, r - y),  # rotate 180
+        lambda x, y: (r - y, x),      # rotate 270
+        lambda x, y: (x, r - y),      # mirror left-right
+        lambda x, y: (r - x, y),      # mirror top-bottom
+        lambda x, y: (y, x),          # main diagonal
+        lambda x, y: (r - y, r - x),  # anti-diagonal
+    )
+
+
+@lru_cache(maxsize=None)
+def group(rows=3, cols=3):
+    """
+    Cell permutation tables of the symmetries of a rows x cols board
+    :param rows: number of rows
+    :param cols: number of cols
+    :return: (transforms, inverses, powers) where transforms[t][cell] is
+    the cell symmetry t sends cell to, inverses[t][cell] the cell it sends
+    to cell and powers[t][cell] the weight of cell's digit in the code of
+    the transformed board
+    """
+    cells = range(rows * cols)
+    transforms = tuple(
+        tuple(tx * cols + ty for tx, ty in (m(cell // cols, cell % cols)
+                                            for cell in cells))
+        for m in board_maps(rows, cols)
+    )
+    inverses = tuple(
+        tuple(perm.index(cell) for cell in cells) for perm in transforms
+    )
+    powers = tuple(tuple(3 ** target for target in perm)
+                   for perm in transforms)
+    return transforms, inverses, powers
+
+
+# Tables of the 3x3 board.
+TRANSFORMS, INVERSES, POWERS = group(3, 3)
+
+
+def canonical(state):
+    """
+    Finds the representative of a position among its symmetries
+    :param state: the state of the current board
+    :return: (code, t) the base-3 code of the representative (digits 0
+    empty, 1 computer, 2 human) and the symmetry t that produces it
+    """
+    digits = [cell % 3 for row in state for cell in row]
+    best_code, best_t = None, 0
+    for t, powers in enumerate(group(len(state), len(state[0]))[2]):
+        code = sum([digit * power for digit, power in zip(digits, powers)])
+        if best_code is None or code < best_code:
+            best_code, best_t = code, t
+    return best_code, best_t
+
+
+def transform_move(x, y, t, rows=3, cols=3):
+    """
+    Sends a move on the played board to the representative
+    :param x: X coordinate
+    :param y: Y coordinate
+    :param t: index of the symmetry returned by canonical()
+    :param rows: number of rows of the board
+    :param cols: number of cols of the board
+    :return: a list [x, y] on the representative
+    """
+    cell = group(rows, cols)[0][t][x * cols + y]
+    return [cell // cols, cell % cols]
+
+
+def restore_move(x, y, t, rows=3, cols=3):
+    """
+    Sends a move on the representative back to the played board
+    :param x: X coordinate on the representative
+    :param y: Y coordinate on the representative
+    :param t: index of the symmetry returned by canonical()
+    :param rows: number of rows of the board
+    :param cols: number of cols of the board
+    :return: a list [x, y] on the played board
+    """
+    cell = group(rows, cols)[1][t][x * cols + y]
+    return [cell // cols, cell % cols]
+
+
+def permute_mask(mask, perm):
+    """
+    Moves every cell of a mask through a permutation
+    :param mask: bit x * cols + y set for each cell [x, y]
+    :param perm: the cell each cell is sent to
+    :return: the permuted mask
+    """
+    result = 0
+    cell = 0
+    while mask:
+        if mask & 1:
+            result |= 1 << perm[cell]
+        mask >>= 1
+        cell += 1
+    return result
+
+
+def transform_mask(mask, t, rows=3, cols=3):
+    """
+    Sends a mask of cells on the played board to the representative
+    :param mask: bit x * cols + y set for each cell [x, y]
+    :param t: index of the symmetry returned by canonical()
+    :param rows: number of rows of the board
+    :param cols: number of cols of the board
+    :return: the mask on the representative
+    """
+    return permute_mask(mask, group(rows, cols)[0][t])
+
+
+def restore_mask(mask, t, rows=3, cols=3):
+    """
+    Sends a mask of cells on the representative back to the played board
+    :param mask: bit x * cols + y set for each cell [x, y]
+    :param t: index of the symmetry returned by canonical()
+    :param rows: number of rows of the board
+    :param cols: number of cols of the board
+    :return: the mask on the played board
+    """
+    return permute_mask(mask, group(rows, cols)[1][t])
+
+
+def first_cell(mask, cols=3):
+    """
+    The first cell of a mask in row-major order, the one minimax would pick
+    among moves with the same score
+    :param mask: bit x * cols + y set for each cell [x, y]
+    :param cols: number of cols of the board
+    :return: a list [x, y], or None if the mask is empty
+    """
+    if not mask:
+        return None
+    cell = (mask & -mask).bit_length() - 1
+    return [cell // cols, cell % cols]
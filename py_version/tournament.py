@@ -0,0 +1,203 @@
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count
+from random import Random
+from time import perf_counter
+from oominimax import Game
+from search import make_engine
+"""
+Self-play tournaments between search engines.
+
+run_tournament() plays N games between two engines (named as in
+search.ENGINES) across worker processes and reports wins, draws and
+losses, move latencies and games per second. The engines alternate who
+moves first, and each game opens with a few random moves so deterministic
+engines do not replay the same game. Every game has its own seed made
+from the tournament seed and the game's number, so results do not depend
+on the number of workers.
+
+Usage: python3 tournament.py alphabeta random --games 1000 --workers 4
+"""
+
+# Player numbers of the two engines: A plays as the computer (+1) and B as
+# the human (-1) side of Game.
+A = +1
+B = -1
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """
+    Nearest-rank percentiles of a list of numbers
+    :param values: the numbers
+    :param points: percentiles to report, 0 to 100
+    :return: a dict 'p50' -> value (and so on) plus 'max', empty if no values
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        rank = max(0, -(-point * len(ordered) // 100) - 1)
+        result[f'p{point}'] = ordered[rank]
+    result['max'] = ordered[-1]
+    return result
+
+
+def play_game(engines, rng, shape, search_depth, openings, first):
+    """
+    Plays one game between two engines
+    :param engines: dict player -> engine
+    :param rng: Random used for the opening moves
+    :param shape: (rows, cols, k) of the board
+    :param search_depth: most plies the engines search, None for all
+    :param openings: number of random moves the game starts with
+    :param first: the player who moves first, A or B
+    :return: (winner, latencies) with winner A, B or 0 and latencies a dict
+    player -> list of move times in milliseconds
+    :raises ValueError: if an engine picks a move that is not legal
+    """
+    game = Game(*shape)
+    latencies = {A: [], B: []}
+    player = first
+    plies = 0
+    while True:
+        cells = game.empty_cells()
+        if not cells:
+            return 0, latencies
+        if plies < openings:
+            x, y = rng.choice(cells)
+        else:
+            depth = len(cells)
+            if search_depth is not None:
+                depth = min(depth, search_depth)
+            start = perf_counter()
+            x, y, _ = engines[player].search(game, depth, player)
+            latencies[player].append((perf_counter() - start) * 1000)
+        if not game.set_move(x, y, player):
+            raise ValueError(f'{engines[player]} played [{x}, {y}], which '
+                             f'is not an empty cell')
+        if game.wins(player):
+            return player, latencies
+        player = -player
+        plies += 1
+
+
+def play_games(spec_a, spec_b, numbers, seed, shape, search_depth, openings):
+    """
+    Plays a share of a tournament, in a worker process
+    :param spec_a: (name, kwargs) of engine A
+    :param spec_b: (name, kwargs) of engine B
+    :param numbers: numbers of the games to play
+    :param seed: seed of the tournament
+    :param shape: (rows, cols, k) of the board
+    :param search_depth: most plies the engines search, None for all
+    :param openings: number of random moves each game starts with
+    :return: (results, latencies) with results a dict 'a_wins', 'b_wins',
+    'draws' and latencies a dict 'a', 'b' of move times in milliseconds
+    """
+    engines = {A: make_engine(spec_a[0], **spec_a[1]),
+               B: make_engine(spec_b[0], **spec_b[1])}
+    results = {'a_wins': 0, 'b_wins': 0, 'draws': 0}
+    latencies = {'a': [], 'b': []}
+    for number in numbers:
+        game_seed = seed * 1000003 + number
+        rng = Random(game_seed)
+        for player, engine in engines.items():
+            if hasattr(engine, 'seed'):
+                engine.seed(game_seed * 2 + (player == A))
+        first = A if number % 2 == 0 else B
+        winner, times = play_game(engines, rng, shape, search_depth,
+                                  openings, first)
+        if winner == A:
+            results['a_wins'] += 1
+        elif winner == B:
+            results['b_wins'] += 1
+        else:
+            results['draws'] += 1
+        latencies['a'].extend(times[A])
+        latencies['b'].extend(times[B])
+    for engine in engines.values():
+        if hasattr(engine, 'close'):
+            engine.close()
+    return results, latencies
+
+
+def run_tournament(engine_a, engine_b, games=100, workers=None, seed=0,
+                   shape=(3, 3, 3), search_depth=None, openings=1,
+                   kwargs_a=None, kwargs_b=None):
+    """
+    Plays games between two engines across worker processes
+    :param engine_a: name of engine A in search.ENGINES
+    :param engine_b: name of engine B in search.ENGINES
+    :param games: number of games
+    :param workers: number of worker processes, one per CPU if None; 0
+    plays every game in this process
+    :param seed: seed of the tournament
+    :param shape: (rows, cols, k) of the board
+    :param search_depth: most plies the engines search, None for all
+    :param openings: number of random moves each game starts with
+    :param kwargs_a: arguments to build engine A with
+    :param kwargs_b: arguments to build engine B with
+    :return: a dict with the results, latency percentiles per engine in
+    milliseconds, elapsed seconds and games per second
+    """
+    spec_a = (engine_a, kwargs_a or {})
+    spec_b = (engine_b, kwargs_b or {})
+    args = (seed, shape, search_depth, openings)
+    results = {'a_wins': 0, 'b_wins': 0, 'draws': 0}
+    latencies = {'a': [], 'b': []}
+
+    start = perf_counter()
+    if workers == 0:
+        shares = [play_games(spec_a, spec_b, range(games), *args)]
+    else:
+        count = workers or cpu_count() or 1
+        with ProcessPoolExecutor(count) as pool:
+            futures = [pool.submit(play_games, spec_a, spec_b,
+                                   range(index, games, count), *args)
+                       for index in range(min(count, games))]
+            shares = [future.result() for future in futures]
+    elapsed = perf_counter() - start
+
+    for share_results, share_latencies in shares:
+        for key in results:
+            results[key] += share_results[key]
+        for key in latencies:
+            latencies[key].extend(share_latencies[key])
+
+    return {
+        'engine_a': engine_a,
+        'engine_b': engine_b,
+        'games': games,
+        'results': results,
+        'latency_ms': {key: percentiles(values)
+                       for key, values in latencies.items()},
+        'seconds': elapsed,
+        'games_per_second': games / elapsed if elapsed else None,
+    }
+
+
+def main():
+    """
+    Runs a tournament from the command line and prints its report as JSON
+    """
+    parser = argparse.ArgumentParser(description='Engine self-play.')
+    parser.add_argument('engine_a')
+    parser.add_argument('engine_b')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, nargs=3, default=(3, 3, 3),
+                        metavar=('ROWS', 'COLS', 'K'))
+    parser.add_argument('--depth', type=int, default=None)
+    parser.add_argument('--openings', type=int, default=1)
+    args = parser.parse_args()
+    report = run_tournament(args.engine_a, args.engine_b, args.games,
+                            args.workers, args.seed, tuple(args.size),
+                            args.depth, args.openings)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
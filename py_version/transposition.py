@@ -0,0 +1,436 @@
+import struct
+from collections import OrderedDict
+"""
+Transposition table used by the minimax searches in oominimax.py.
+
+Identical positions are reached through many different move orders, so the
+result of searching a position is stored under a position key and reused
+the next time the same position (with the same player to move) turns up.
+
+SharedTranspositionTable keeps its entries in a shared memory segment
+instead, so every process attached to it reuses the others' results. Its
+keys must be 64-bit, like the Zobrist keys Game.table_key() gives.
+Game.minimax() and AlphaBetaEngine store different scores and moves, so
+AlphaBetaEngine XORs zobrist.NEGAMAX_KEY into its keys and both can
+search with the same table.
+"""
+
+# Entry flags: the stored score is exact, a lower bound (the search failed
+# high) or an upper bound (the search failed low).
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Layout of a shared table: a header (magic, version, number of buckets)
+# then buckets of two entries, each three 64-bit words: the key XORed with
+# the other two, the score's bits and the packed depth, flag and move.
+SHARED_MAGIC = b'TTSH'
+SHARED_VERSION = 1
+SHARED_HEADER = struct.Struct('<4sB3xQ')
+SHARED_ENTRY = struct.Struct('<QQQ')
+BUCKET_SIZE = 2 * SHARED_ENTRY.size
+DOUBLE = struct.Struct('<d')
+WORD = struct.Struct('<Q')
+# Bits of an entry's packed word: in use, score is an int, then the flag
+# (2 bits), the kind of move (2 bits), the depth (8 bits) and the move.
+USED, INT_SCORE = 1, 2
+FLAG_SHIFT, KIND_SHIFT, DEPTH_SHIFT, MOVE_SHIFT = 2, 4, 8, 16
+# Most cells a stored mask of cells can have, the bits above MOVE_SHIFT.
+MAX_MASK_CELLS = 64 - MOVE_SHIFT
+# Kinds of stored move: none, a mask of cells, or an (x, y) pair.
+NO_MOVE, MASK_MOVE, PAIR_MOVE = 0, 1, 2
+# created_segments (set): Names of the segments this process created.
+created_segments = set()
+
+
+class TranspositionTable():
+    def __init__(self, size=1 << 16, policy='lru'):
+        """Constructs necessary attributes for the TranspositionTable class.
+
+        Arguments:
+        self: Represents instance of TranspositionTable().
+        size (int): Maximum number of entries kept in the table.
+        policy (str): Replacement policy once the table is full, either
+        'lru' (evict the least recently used entry) or 'depth' (one slot
+        per key hash, keep the entry that was searched deeper).
+
+        Return: None
+        """
+        if size < 1:
+            raise ValueError('size must be positive')
+        if policy not in ('lru', 'depth'):
+            raise ValueError(f'unknown replacement policy {policy!r}')
+        # self.size (int): Maximum number of entries.
+        self.size = size
+        # self.policy (str): Replacement policy.
+        self.policy = policy
+        # self.hits (int): Number of successful probes.
+        self.hits = 0
+        # self.misses (int): Number of probes that found nothing.
+        self.misses = 0
+        self.clear()
+
+    def __str__(self):
+        """Informal string representation of TranspositionTable().
+
+        Arguments: self: Represents instance of TranspositionTable().
+
+        Return: Informal string representing TranspositionTable().
+        """
+        return """A transposition table holding {} of {} entries ({}
+         replacement) with {} hits and {} misses""".format(
+                len(self), self.size, self.policy, self.hits, self.misses)
+
+    def __len__(self):
+        """Number of entries currently stored.
+
+        Arguments: self: Represents instance of TranspositionTable().
+
+        Return: (int) number of stored entries.
+        """
+        if self.policy == 'lru':
+            return len(self.entries)
+        return self.used
+
+    def clear(self):
+        """Removes every entry from the table.
+
+        Arguments: self: Represents instance of TranspositionTable().
+
+        Return: None
+        """
+        if self.policy == 'lru':
+            # self.entries (OrderedDict): key -> entry, oldest use first.
+            self.entries = OrderedDict()
+        else:
+            # self.entries (list): One entry (or None) per slot.
+            self.entries = [None] * self.size
+            # self.used (int): Number of occupied slots.
+            self.used = 0
+
+    def probe(self, key):
+        """Looks up the entry stored for a position.
+
+        Arguments:
+        self: Represents instance of TranspositionTable().
+        key (int): Position key, including the player to move.
+
+        Return: (tuple) (depth, flag, score, move) or None if not stored.
+        """
+        if self.policy == 'lru':
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+        else:
+            entry = self.entries[hash(key) % self.size]
+            if entry is not None and entry[0] != key:
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1:]
+
+    def store(self, key, depth, flag, score, move):
+        """Stores the result of searching a position.
+
+        Arguments:
+        self: Represents instance of TranspositionTable().
+        key (int): Position key, including the player to move.
+        depth (int): Remaining depth the position was searched to.
+        flag (int): EXACT, LOWER or UPPER.
+        score (number): Score found by the search.
+        move (object): Best move found, in whatever form the search uses,
+        or None.
+
+        Return: None
+        """
+        entry = (key, depth, flag, score, move)
+        if self.policy == 'lru':
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+            return
+
+        slot = hash(key) % self.size
+        old = self.entries[slot]
+        if old is None:
+            self.used += 1
+        elif old[0] != key and old[1] > depth:
+            # Depth-preferred: keep the deeper, more expensive result.
+            return
+        self.entries[slot] = entry
+
+    def lookup(self, key, depth, alpha, beta):
+        """Probes the table and checks whether the entry settles the search.
+
+        Arguments:
+        self: Represents instance of TranspositionTable().
+        key (int): Position key, including the player to move.
+        depth (int): Remaining depth the caller is about to search.
+        alpha (number): Lower end of the caller's search window.
+        beta (number): Upper end of the caller's search window.
+
+        Return: (tuple) (score, move); score is None unless the stored
+        entry was searched to the same depth (a deeper search scores its
+        leaves differently) and its bound falls outside the window.
+        """
+        entry = self.probe(key)
+        if entry is None:
+            return None, None
+        entry_depth, flag, score, move = entry
+        if entry_depth == depth:
+            if flag == EXACT:
+                return score, move
+            if flag == LOWER and score >= beta:
+                return score, move
+            if flag == UPPER and score <= alpha:
+                return score, move
+        return None, move
+
+
+class SharedTranspositionTable():
+    def __init__(self, size=1 << 16, name=None):
+        """Constructs necessary attributes for the SharedTranspositionTable
+        class, creating a new segment or attaching to an existing one.
+
+        Arguments:
+        self: Represents instance of SharedTranspositionTable().
+        size (int): Number of entries of a new segment, rounded up to
+        whole buckets of two.
+        name (str): Name of a segment to attach to instead, as another
+        table's name gives it.
+
+        Return: None
+        """
+        # Imported here so that importing this module for the in-process
+        # table does not load multiprocessing.
+        from multiprocessing import parent_process, resource_tracker
+        from multiprocessing.shared_memory import SharedMemory
+        if name is None:
+            if size < 1:
+                raise ValueError('size must be positive')
+            buckets = (size + 1) // 2
+            segment = SharedMemory(create=True, size=SHARED_HEADER.size
+                                   + buckets * BUCKET_SIZE)
+            SHARED_HEADER.pack_into(segment.buf, 0, SHARED_MAGIC,
+                                    SHARED_VERSION, buckets)
+            created_segments.add(segment.name)
+        else:
+            try:
+                # Only the creator tracks the segment, so that no
+                # resource tracker removes it or reports it leaked when an
+                # attached process exits.
+                segment = SharedMemory(name=name, track=False)
+            except TypeError:
+                # Before Python 3.13, attaching always tracks it.
+                segment = SharedMemory(name=name)
+                if parent_process() is None \
+                        and name not in created_segments:
+                    # Not started by multiprocessing, so this process has
+                    # its own resource tracker, which would remove the
+                    # segment when the process exits.
+                    resource_tracker.unregister(segment._name,
+                                                'shared_memory')
+            magic, version, buckets = SHARED_HEADER.unpack_from(
+                segment.buf, 0)
+            if magic != SHARED_MAGIC or version != SHARED_VERSION:
+                segment.close()
+                raise ValueError(f'{name} is not a shared table')
+        # self.segment (SharedMemory): The shared memory segment.
+        self.segment = segment
+        # self.name (str): Name other processes attach with.
+        self.name = segment.name
+        # self.owner (bool): Whether this table created the segment.
+        self.owner = name is None
+        # self.buckets (int): Number of buckets of two entries.
+        self.buckets = buckets
+        # self.size (int): Maximum number of entries.
+        self.size = 2 * buckets
+        # self.max_cells (int): Largest board whose masks of cells fit.
+        self.max_cells = MAX_MASK_CELLS
+        # self.buf (memoryview): The segment's bytes.
+        self.buf = segment.buf
+        # self.hits (int): Number of successful probes in this process.
+        self.hits = 0
+        # self.misses (int): Number of probes that found nothing here.
+        self.misses = 0
+
+    def __str__(self):
+        """Informal string representation of SharedTranspositionTable().
+
+        Arguments: self: Represents instance of SharedTranspositionTable().
+
+        Return: Informal string representing SharedTranspositionTable().
+        """
+        return """A shared transposition table {} of {} entries with {}
+         hits and {} misses here""".format(
+                self.name, self.size, self.hits, self.misses)
+
+    def __len__(self):
+        """Number of entries currently stored, counted by scanning.
+
+        Arguments: self: Represents instance of SharedTranspositionTable().
+
+        Return: (int) number of stored entries.
+        """
+        count = 0
+        for offset in range(SHARED_HEADER.size, len(self.buf),
+                            SHARED_ENTRY.size):
+            if SHARED_ENTRY.unpack_from(self.buf, offset)[2] & USED:
+                count += 1
+        return count
+
+    def __enter__(self):
+        """Using the table in a with statement closes it after.
+
+        Arguments: self: Represents instance of SharedTranspositionTable().
+
+        Return: self
+        """
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the table, and removes the segment if this table made it.
+
+        Arguments: self: Represents instance of SharedTranspositionTable().
+
+        Return: None
+        """
+        self.close()
+        if self.owner:
+            self.unlink()
+
+    def close(self):
+        """Detaches this process from the segment.
+
+        Arguments: self: Represents instance of SharedTranspositionTable().
+
+        Return: None
+        """
+        self.buf.release()
+        self.segment.close()
+
+    def unlink(self):
+        """Removes the segment once every process has closed it.
+
+        Arguments: self: Represents instance of SharedTranspositionTable().
+
+        Return: None
+        """
+        self.segment.unlink()
+
+    def clear(self):
+        """Removes every entry from the table, for every process.
+
+        Arguments: self: Represents instance of SharedTranspositionTable().
+
+        Return: None
+        """
+        start = SHARED_HEADER.size
+        self.buf[start:] = bytes(len(self.buf) - start)
+
+    def probe(self, key):
+        """Looks up the entry stored for a position. Entries are written
+        without locks; one caught half written does not check against its
+        key and counts as a miss.
+
+        Arguments:
+        self: Represents instance of SharedTranspositionTable().
+        key (int): 64-bit position key, including the player to move.
+
+        Return: (tuple) (depth, flag, score, move) or None if not stored.
+        """
+        offset = SHARED_HEADER.size + key % self.buckets * BUCKET_SIZE
+        for slot in (offset, offset + SHARED_ENTRY.size):
+            check, bits, packed = SHARED_ENTRY.unpack_from(self.buf, slot)
+            if packed & USED and check ^ bits ^ packed == key:
+                self.hits += 1
+                return unpack_entry(bits, packed)
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        """Stores the result of searching a position. The first entry of a
+        bucket keeps the deepest result, the second the latest one.
+
+        Arguments:
+        self: Represents instance of SharedTranspositionTable().
+        key (int): 64-bit position key, including the player to move.
+        depth (int): Remaining depth the position was searched to.
+        flag (int): EXACT, LOWER or UPPER.
+        score (number): Score found by the search.
+        move (object): Best move found: None, a mask of cells (int) or an
+        (x, y) pair.
+
+        Return: None
+        """
+        bits, packed = pack_entry(depth, flag, score, move)
+        offset = SHARED_HEADER.size + key % self.buckets * BUCKET_SIZE
+        check, old_bits, old = SHARED_ENTRY.unpack_from(self.buf, offset)
+        if old & USED and check ^ old_bits ^ old != key \
+                and (old >> DEPTH_SHIFT) & 0xFF > depth:
+            offset += SHARED_ENTRY.size
+        SHARED_ENTRY.pack_into(self.buf, offset, key ^ bits ^ packed,
+                               bits, packed)
+
+    def lookup(self, key, depth, alpha, beta):
+        """Probes the table and checks whether the entry settles the
+        search, like TranspositionTable.lookup().
+
+        Arguments:
+        self: Represents instance of SharedTranspositionTable().
+        key (int): 64-bit position key, including the player to move.
+        depth (int): Remaining depth the caller is about to search.
+        alpha (number): Lower end of the caller's search window.
+        beta (number): Upper end of the caller's search window.
+
+        Return: (tuple) (score, move); score is None unless the stored
+        entry was searched to the same depth and its bound falls outside
+        the window.
+        """
+        return TranspositionTable.lookup(self, key, depth, alpha, beta)
+
+
+def pack_entry(depth, flag, score, move):
+    """
+    Packs a shared table entry
+    :param depth: remaining depth, at most 255 is kept
+    :param flag: EXACT, LOWER or UPPER
+    :param score: int or float score
+    :param move: None, a mask of cells or an (x, y) pair
+    :return: (bits, packed) the score's bits and the packed word
+    """
+    if isinstance(move, int) and move >> MAX_MASK_CELLS:
+        raise ValueError(f'masks of more than {MAX_MASK_CELLS} cells do '
+                         'not fit in a shared table')
+    packed = USED | flag << FLAG_SHIFT | min(depth, 0xFF) << DEPTH_SHIFT
+    if isinstance(score, int):
+        packed |= INT_SCORE
+    if isinstance(move, int):
+        packed |= MASK_MOVE << KIND_SHIFT | move << MOVE_SHIFT
+    elif move is not None:
+        packed |= PAIR_MOVE << KIND_SHIFT \
+            | (move[0] << 16 | move[1]) << MOVE_SHIFT
+    return WORD.unpack(DOUBLE.pack(score))[0], packed
+
+
+def unpack_entry(bits, packed):
+    """
+    Unpacks a shared table entry
+    :param bits: the score's bits
+    :param packed: the packed word
+    :return: (depth, flag, score, move) as they were stored
+    """
+    score = DOUBLE.unpack(WORD.pack(bits))[0]
+    if packed & INT_SCORE:
+        score = int(score)
+    kind = (packed >> KIND_SHIFT) & 3
+    move = packed >> MOVE_SHIFT
+    if kind == NO_MOVE:
+        move = None
+    elif kind == PAIR_MOVE:
+        move = (move >> 16, move & 0xFFFF)
+    return ((packed >> DEPTH_SHIFT) & 0xFF, (packed >> FLAG_SHIFT) & 3,
+            score, move)
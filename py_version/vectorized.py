@@ -0,0 +1,151 @@
+import argparse
+import numpy as np
+from batch import line_matrix
+from book import default_path, record_layout, write_book
+from oominimax import LINE_WEIGHT
+"""
+Whole-ply solving and evaluation with NumPy (which this module needs).
+
+Every position of a ply is one row of an (N, rows * cols) int8 array,
+seen by the player to move (+1 own pieces, -1 the opponent's), so a
+single product with the line incidence matrix of batch.py gives every
+line sum of the whole frontier at once: the player who just moved has
+won wherever a sum is -k. levels() expands the open positions of a ply
+into the next one in bulk, keeping each position once by its base-3
+code, and solve() backs the values up from the last ply to the first,
+one array operation per ply instead of one call per position. The
+result is the same table as retrograde.py and book.py write.
+
+evaluate_batch() gives Game.evaluate() of many boards at once, for
+analytics.
+
+Usage: python3 vectorized.py [book.bin] [--size 3 4 3]
+"""
+
+
+def board_codes(boards):
+    """
+    Base-3 codes of boards as book.py indexes them
+    :param boards: (N, cells) int8 array of -1, 0 and +1
+    :return: int64 array of the codes, -1 as digit 2
+    """
+    powers = 3 ** np.arange(boards.shape[1], dtype=np.int64)
+    return (boards % 3).astype(np.int64) @ powers
+
+
+def levels(rows=3, cols=3, k=3):
+    """
+    Every reachable position, ply by ply, with the moves between them
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: a list with, for each ply, a tuple (boards, lost, full,
+    parents, cells, children): the (N, cells) boards seen by the player
+    to move, whether the player to move has lost, whether the board is
+    full, and for every move out of the ply (in row-major order per
+    position) its position's row, its cell and the row of the position
+    it leads to in the next ply
+    """
+    matrix = line_matrix(rows, cols, k)
+    boards = np.zeros((1, rows * cols), dtype=np.int8)
+    found = []
+    while True:
+        sums = boards.astype(np.int16) @ matrix
+        lost = (sums == -k).any(axis=1)
+        full = (boards != 0).all(axis=1)
+        open_boards = ~(lost | full)
+        parents, cells = np.nonzero((boards == 0) & open_boards[:, None])
+        if len(parents) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            found.append((boards, lost, full, empty, empty, empty))
+            return found
+
+        following = boards[parents]
+        following[np.arange(len(parents)), cells] = 1
+        # The opponent moves next, so the child is seen from their side.
+        np.negative(following, out=following)
+        codes = board_codes(following)
+        unique, first, children = np.unique(codes, return_index=True,
+                                            return_inverse=True)
+        found.append((boards, lost, full, parents, cells,
+                      children.ravel()))
+        boards = following[first]
+
+
+def solve(rows=3, cols=3, k=3):
+    """
+    Scores every reachable position from the last ply back
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: (records, count) the records of a book.py table and the
+    number of positions with a move in it
+    """
+    size, bits = record_layout(rows * cols)
+    records = np.full(3 ** (rows * cols), (1 << 8 * size) - 1,
+                      dtype=np.uint8 if size == 1 else np.dtype('<u2'))
+    values = None
+    count = 0
+    for boards, lost, full, parents, cells, children in \
+            reversed(levels(rows, cols, k)):
+        # Finished positions: -1 if the last mover made a line, else 0.
+        scores = np.where(lost, -1, 0).astype(np.int8)
+        if len(parents):
+            edge = -values[children]
+            best = np.full(len(boards), -2, dtype=np.int8)
+            np.maximum.at(best, parents, edge)
+            # The first move in row-major order with the best score.
+            optimal = np.flatnonzero(edge == best[parents])
+            movers, first = np.unique(parents[optimal], return_index=True)
+            moves = cells[optimal[first]]
+            scores[movers] = best[movers]
+            codes = board_codes(boards[movers])
+            records[codes] = (best[movers].astype(np.int64) + 1) << bits \
+                | moves
+            count += len(movers)
+        values = scores
+    return records.tobytes(), count
+
+
+def evaluate_batch(boards, rows=3, cols=3, k=3):
+    """
+    Game.evaluate() of many boards at once
+    :param boards: (N, rows * cols) array of -1 (human), 0 and +1
+    (computer)
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: float64 array: +1 where the computer wins, -1 where the
+    human wins, else the open-line heuristic of Game.heuristic()
+    """
+    boards = np.asarray(boards, dtype=np.int8).reshape(-1, rows * cols)
+    matrix = line_matrix(rows, cols, k)
+    comp = (boards == 1).astype(np.int16) @ matrix
+    human = (boards == -1).astype(np.int16) @ matrix
+    weights = np.concatenate(([0], LINE_WEIGHT ** np.arange(k,
+                                                            dtype=np.int64)))
+    score = (np.where(human == 0, weights[comp], 0)
+             - np.where(comp == 0, weights[human], 0)).sum(axis=1)
+    result = score / (matrix.shape[1] * LINE_WEIGHT ** (k - 1))
+    result[(human == k).any(axis=1)] = -1
+    result[(comp == k).any(axis=1)] = 1
+    return result
+
+
+def main():
+    """
+    Solves a board from the command line and writes its table
+    """
+    parser = argparse.ArgumentParser(description='NumPy ply solver.')
+    parser.add_argument('path', nargs='?', default=None)
+    parser.add_argument('--size', type=int, nargs=3, default=(3, 3, 3),
+                        metavar=('ROWS', 'COLS', 'K'))
+    args = parser.parse_args()
+    path = args.path or default_path(*args.size)
+    records, count = solve(*args.size)
+    write_book(path, records, *args.size)
+    print(f'Wrote {count} positions to {path}')
+
+
+if __name__ == '__main__':
+    main()
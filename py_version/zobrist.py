@@ -0,0 +1,110 @@
+from functools import lru_cache
+from symmetry import group
+"""
+Zobrist keys of tic-tac-toe positions.
+
+Every (cell, player) pair gets a random 64-bit number and a position's key
+is the XOR of the numbers of its pieces, so playing or taking back a move
+changes the key with one XOR. The numbers come from a splitmix64 stream
+with a fixed seed rather than from random or hash(), so keys are the same
+in every process and every run, and tables stored on disk with them stay
+valid. Each variant (rows, cols, k) has its own stream and its own base
+number XORed into every key, so positions of different variants, even
+empty boards, do not share keys in a table that sees several of them.
+
+Game keeps one key per symmetry of the board (the key of the board seen
+through that symmetry) up to date in make_move() and unmake_move(); the
+smallest of them is the key of the symmetry representative.
+"""
+
+HUMAN = -1
+COMP = +1
+# Seed of the key stream; changing it invalidates every stored key.
+SEED = 0x5EED7AC7AC70E
+MASK = (1 << 64) - 1
+# Number XORed into the keys AlphaBetaEngine stores its entries under
+# (scores from the mover's point of view, (x, y) moves), so that they
+# never share a key with the ones of Game.minimax() (scores from the
+# computer's point of view, masks of cells) in a table both search with.
+NEGAMAX_KEY = 0xA5C0FFEE5EA2C4ED
+
+
+def splitmix64(seed):
+    """
+    The splitmix64 generator
+    :param seed: 64-bit starting state
+    :return: an endless generator of 64-bit numbers
+    """
+    while True:
+        seed = (seed + 0x9E3779B97F4A7C15) & MASK
+        z = seed
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+        yield z ^ (z >> 31)
+
+
+def variant_seed(rows, cols, k):
+    """
+    Seed of the key stream of one variant
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: 64-bit seed, different for every (rows, cols, k)
+    """
+    return next(splitmix64(SEED ^ (rows << 32 | cols << 16 | k)))
+
+
+@lru_cache(maxsize=None)
+def keys(rows=3, cols=3, k=3):
+    """
+    Zobrist numbers of a rows x cols board with k in a row to win
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: (base, side, cells) where base is XORed into every key,
+    side into keys with the computer to move and cells[cell] is a dict
+    player -> number, cells numbered x * cols + y
+    """
+    stream = splitmix64(variant_seed(rows, cols, k))
+    base = next(stream)
+    side = next(stream)
+    cells = tuple({COMP: next(stream), HUMAN: next(stream)}
+                  for cell in range(rows * cols))
+    return base, side, cells
+
+
+@lru_cache(maxsize=None)
+def symmetric_keys(rows=3, cols=3, k=3):
+    """
+    Zobrist numbers of each cell as seen through every symmetry
+    :param rows: number of rows
+    :param cols: number of cols
+    :param k: number in a row needed to win
+    :return: a nested list where [x][y][player][t] is the number XORed
+    into the key of symmetry t when player plays [x, y]
+    """
+    cells = keys(rows, cols, k)[2]
+    transforms = group(rows, cols)[0]
+    return [[{player: tuple(cells[perm[x * cols + y]][player]
+                            for perm in transforms)
+              for player in (COMP, HUMAN)}
+             for y in range(cols)] for x in range(rows)]
+
+
+def zobrist_key(state, player=None, k=3):
+    """
+    Zobrist key of a board, computed from scratch
+    :param state: the state of the current board
+    :param player: the player to move, or None to leave it out
+    :param k: number in a row needed to win
+    :return: a 64-bit int
+    """
+    base, side, cells = keys(len(state), len(state[0]), k)
+    key = base ^ side if player == COMP else base
+    cell = 0
+    for row in state:
+        for piece in row:
+            if piece != 0:
+                key ^= cells[cell][piece]
+            cell += 1
+    return key